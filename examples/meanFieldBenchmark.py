@@ -0,0 +1,63 @@
+import numpy as np
+import time
+
+from simulators.fires.LatticeForest import LatticeForest
+from simulators.fires.MeanFieldForest import MeanFieldForest
+
+
+def affected(stats):
+    """
+    Number of Trees that are on fire or burnt.
+    """
+    return stats[1] + stats[2]
+
+
+if __name__ == "__main__":
+    # compare the number of Trees affected by the fire after a fixed number of time steps and at the end of the fire
+    dimension = 100
+    horizon = 20
+    num_runs = 10
+    block_sizes = [1, 2, 5, 10]
+
+    # subcritical, near-critical and supercritical fires
+    for alpha in [0.05, 0.1, 0.15, 0.2763]:
+        print('alpha = %0.4f' % alpha)
+
+        start = time.time()
+        at_horizon, at_end = [], []
+        for seed in range(num_runs):
+            sim = LatticeForest(dimension, rng=seed, alpha=np.full((dimension, dimension), alpha))
+            while not sim.end:
+                sim.update()
+                if sim.iter == horizon:
+                    at_horizon.append(affected(sim.stats))
+            if sim.iter < horizon:
+                at_horizon.append(affected(sim.stats))
+            at_end.append(affected(sim.stats))
+        elapsed = (time.time() - start)/num_runs
+        print('  exact:           t=%d: %7.1f +/- %6.1f   end: %7.1f +/- %6.1f   %8.4f s/run'
+              % (horizon, np.mean(at_horizon), np.std(at_horizon), np.mean(at_end), np.std(at_end), elapsed))
+
+        for block_size in block_sizes:
+            start = time.time()
+            sim = MeanFieldForest(dimension, block_size, alpha=alpha)
+            value = None
+            while not sim.end:
+                sim.update()
+                if sim.iter == horizon:
+                    value = affected(sim.stats)
+            value = affected(sim.stats) if value is None else value
+            elapsed = time.time() - start
+            print('  mean-field, %2d: t=%d: %7.1f             end: %7.1f             %8.4f s/run'
+                  % (block_size, horizon, value, affected(sim.stats), elapsed))
+        print()
+
+    # time per step for a large forest
+    dimension = 2000
+    for block_size in [10, 50]:
+        sim = MeanFieldForest(dimension, block_size)
+        start = time.time()
+        for _ in range(100):
+            sim.update()
+        print('%dx%d forest, blocks of %d: %0.5f s/step' % (dimension, dimension, block_size,
+                                                         (time.time() - start)/100))
@@ -3,7 +3,7 @@ import setuptools
 with open("README.md", "r") as fh:
     long_description = fh.read()
 
-requirements = ["numpy"]
+requirements = ["numpy>=1.17"]
 
 setuptools.setup(
     name="simulators",
@@ -18,12 +18,12 @@ setuptools.setup(
     package_data={"simulators": ["epidemics/west_africa_graph.pkl"]},
     classifiers=[
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
-        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.8",
     install_requires=requirements,
+    extras_require={"jit": ["numba"]},
     license="MIT License",
 )
\ No newline at end of file
@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+import numpy as np
+
+from simulators.Packing import PackedState
+
+
+def _encode(value, arrays):
+    """
+    Helper function to convert a snapshot into JSON serializable data. Numpy arrays are moved to 'arrays' and
+    replaced by a reference, and tuples and dictionaries with non-string keys are tagged so they can be recreated.
+    """
+    if isinstance(value, PackedState):
+        arrays.append(value.data)
+        return {'__packed__': len(arrays)-1, 'shape': list(value.shape)}
+
+    if isinstance(value, np.ndarray):
+        arrays.append(value)
+        return {'__array__': len(arrays)-1}
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    if isinstance(value, (list, tuple)):
+        # lists of integer tuples, such as the positions of Trees on fire, are stored as a single array
+        if value and isinstance(value, list) and all(isinstance(v, tuple) and len(v) == len(value[0]) and
+                                                     all(isinstance(x, (int, np.integer)) for x in v)
+                                                     for v in value):
+            arrays.append(np.array(value, dtype=np.int64))
+            return {'__tuples__': len(arrays)-1}
+
+        items = [_encode(v, arrays) for v in value]
+        return {'__tuple__': items} if isinstance(value, tuple) else items
+
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value.keys()):
+            return {'__dict__': {k: _encode(v, arrays) for k, v in value.items()}}
+        return {'__items__': [[_encode(k, arrays), _encode(v, arrays)] for k, v in value.items()]}
+
+    return value
+
+
+def _decode(value, arrays):
+    """
+    Helper function to recreate a snapshot from the output of _encode.
+    """
+    if isinstance(value, list):
+        return [_decode(v, arrays) for v in value]
+
+    if not isinstance(value, dict):
+        return value
+
+    if '__packed__' in value:
+        return PackedState(arrays[value['__packed__']], value['shape'])
+    elif '__array__' in value:
+        return arrays[value['__array__']]
+    elif '__tuples__' in value:
+        return [tuple(v) for v in arrays[value['__tuples__']].tolist()]
+    elif '__tuple__' in value:
+        return tuple(_decode(v, arrays) for v in value['__tuple__'])
+    elif '__dict__' in value:
+        return {k: _decode(v, arrays) for k, v in value['__dict__'].items()}
+
+    return {_decode(k, arrays): _decode(v, arrays) for k, v in value['__items__']}
+
+
+def save_archive(path, name, data, compress=False):
+    """
+    Save a snapshot, or any dictionary in the same format, as a numpy .npz archive without pickling. The archive is
+    written to a temporary file in the same directory and then renamed, so an existing file is only replaced by a
+    complete archive.
+
+    :param path: file path
+    :param name: string stored with the data, such as the simulator class name
+    :param data: dictionary of numpy arrays, PackedState objects, and JSON serializable values, lists, tuples and
+                 dictionaries
+    :param compress: if True, the archive is compressed, which is smaller but slower to write
+    """
+    # the header keys are those of the original checkpoint format, so existing checkpoints remain readable
+    arrays = []
+    header = {'simulator': name, 'snapshot': _encode(data, arrays)}
+    entries = {'array_{0}'.format(i): array for i, array in enumerate(arrays)}
+    entries['header'] = np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            (np.savez_compressed if compress else np.savez)(f, **entries)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+    return
+
+
+def read_archive(path):
+    """
+    Read an archive created by save_archive.
+
+    :return: tuple (name, data)
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        header = json.loads(archive['header'].tobytes().decode('utf-8'))
+        arrays = [archive['array_{0}'.format(i)] for i in range(len(archive.files)-1)]
+
+    return header['simulator'], _decode(header['snapshot'], arrays)
+
+
+def save_checkpoint(simulator, path, packed=True, compress=False):
+    """
+    Save the state of a simulator to disk, including the random number generator state, so that a simulation
+    can be resumed with load_checkpoint. The checkpoint is written atomically, see save_archive.
+
+    :param simulator: simulator with 'snapshot' and 'restore' methods, such as LatticeForest, UrbanForest or WestAfrica
+    :param path: path of the checkpoint file, a numpy .npz archive
+    :param packed: if True, element states are packed into 2 bits, see pack_state
+    :param compress: if True, the archive is compressed, which is smaller but slower to write
+    """
+    save_archive(path, type(simulator).__name__, simulator.snapshot(packed=packed), compress=compress)
+    return
+
+
+def read_checkpoint(path):
+    """
+    Read a checkpoint created by save_checkpoint.
+
+    :return: tuple (name, snapshot) where name is the simulator class name and snapshot can be applied with 'restore'
+    """
+    return read_archive(path)
+
+
+def load_checkpoint(simulator, path):
+    """
+    Resume a simulation from a checkpoint created by save_checkpoint. The simulator should be created with the same
+    arguments as the simulator that was saved, since the checkpoint does not store parameters.
+
+    :param simulator: simulator to restore
+    :param path: path of the checkpoint file
+    :return: the simulator
+    """
+    name, snapshot = read_checkpoint(path)
+    if name != type(simulator).__name__:
+        raise ValueError('checkpoint is for a {0} simulator, not {1}'.format(name, type(simulator).__name__))
+
+    simulator.restore(snapshot)
+    return simulator
@@ -0,0 +1,199 @@
+import numpy as np
+
+try:
+    import numba
+    HAS_NUMBA = True
+except ImportError:
+    numba = None
+    HAS_NUMBA = False
+
+
+# compiled kernels are used when Numba is installed, unless disabled with use_jit(False)
+USE_JIT = HAS_NUMBA
+
+
+def use_jit(enabled=True):
+    """
+    Enable or disable the compiled kernels. The NumPy implementations are always available and produce identical
+    results, so this only changes performance.
+
+    :param enabled: if True, use compiled kernels when Numba is installed
+    :return: True if compiled kernels are used
+    """
+    global USE_JIT
+    USE_JIT = bool(enabled) and HAS_NUMBA
+    return USE_JIT
+
+
+def jit_enabled():
+    """
+    :return: True if compiled kernels are used
+    """
+    return USE_JIT
+
+
+def _njit(function):
+    """
+    Helper function to compile a kernel with Numba when it is installed. Compilation happens on the first call.
+    """
+    if not HAS_NUMBA:
+        return function
+    return numba.njit(nogil=True)(function)
+
+
+@_njit
+def _neighbor_counts(on_fire, dr, dc, weight, counts):
+    height, width = on_fire.shape
+    for r in range(height):
+        for c in range(width):
+            # sum in kernel order, as in the NumPy implementation, so that weighted counts are identical
+            total = counts[r, c]
+            for k in range(dr.size):
+                rr, cc = r + dr[k], c + dc[k]
+                if 0 <= rr < height and 0 <= cc < width and on_fire[rr, cc]:
+                    total += weight[k]
+            counts[r, c] = total
+    return counts
+
+
+def neighbor_counts(on_fire, offsets, dtype):
+    """
+    Compiled version of Stencil.neighbor_counts.
+
+    :param on_fire: 2D boolean numpy array indicating elements on fire
+    :param offsets: list of (delta row, delta col, weight) created by stencil_offsets
+    :param dtype: numpy dtype of the counts
+    :return: 2D numpy array with the same shape as on_fire
+    """
+    dr = np.array([o[0] for o in offsets], dtype=np.int64)
+    dc = np.array([o[1] for o in offsets], dtype=np.int64)
+    weight = np.array([o[2] for o in offsets], dtype=dtype)
+    counts = np.zeros(on_fire.shape, dtype=dtype)
+    return _neighbor_counts(np.ascontiguousarray(on_fire), dr, dc, weight, counts)
+
+
+@_njit
+def _percolate(reached, edges, healthy, dr, dc):
+    num_samples, height, width = reached.shape
+    stack = np.empty(height*width, dtype=np.int64)
+    for s in range(num_samples):
+        size = 0
+        for r in range(height):
+            for c in range(width):
+                if reached[s, r, c]:
+                    stack[size] = r*width + c
+                    size += 1
+
+        # depth-first traversal gives the same reachable set as a breadth-first search, with less work per element
+        while size > 0:
+            size -= 1
+            r, c = stack[size] // width, stack[size] % width
+            for k in range(dr.size):
+                if not edges[k, s, r, c]:
+                    continue
+                rr, cc = r + dr[k], c + dc[k]
+                if 0 <= rr < height and 0 <= cc < width and healthy[rr, cc] and not reached[s, rr, cc]:
+                    reached[s, rr, cc] = True
+                    stack[size] = rr*width + cc
+                    size += 1
+    return reached
+
+
+def percolate(reached, edges, healthy, offsets):
+    """
+    Compiled version of the frontier traversal in Percolation.sample_burnt_area.
+
+    :param reached: 3D boolean numpy array of shape (samples, height, width) with the Trees on fire, modified in place
+    :param edges: list with one 3D boolean numpy array per offset, indicating which Trees spread fire at that offset
+    :param healthy: 2D boolean numpy array indicating healthy Trees
+    :param offsets: list of (delta row, delta col, weight) from a Tree to the neighbors it can spread fire to
+    :return: reached, with every healthy Tree reachable through the edges set to True
+    """
+    dr = np.array([o[0] for o in offsets], dtype=np.int64)
+    dc = np.array([o[1] for o in offsets], dtype=np.int64)
+    return _percolate(reached, np.ascontiguousarray(np.stack(edges)), np.ascontiguousarray(healthy), dr, dc)
+
+
+@_njit
+def _gather_neighbors(indptr, indices, nodes, neighbors):
+    position = 0
+    for node in nodes:
+        for j in range(indptr[node], indptr[node+1]):
+            neighbors[position] = indices[j]
+            position += 1
+    return neighbors
+
+
+def gather_neighbors(indptr, indices, nodes, total):
+    """
+    Compiled version of GraphSimulator.gather_neighbors.
+
+    :param total: total number of neighbors of the nodes
+    """
+    return _gather_neighbors(indptr, indices, nodes, np.empty(total, dtype=indices.dtype))
+
+
+@_njit
+def _healthy_neighbors(indptr, indices, nodes, state, healthy, neighbors):
+    size = 0
+    for node in nodes:
+        for j in range(indptr[node], indptr[node+1]):
+            if state[indices[j]] == healthy:
+                neighbors[size] = indices[j]
+                size += 1
+    return neighbors[:size]
+
+
+def healthy_neighbors(indptr, indices, nodes, state, healthy):
+    """
+    Compiled version of the frontier traversal in GraphSimulator.update, which gathers the neighbor lists of the
+    active nodes and keeps the healthy neighbors in one pass, without intermediate arrays.
+
+    :param nodes: 1D array of active node ids
+    :param state: 1D numpy array of node states
+    :param healthy: healthy state
+    :return: 1D array of healthy neighbor node ids, with repeats, in the same order as the NumPy implementation
+    """
+    total = int((indptr[nodes+1] - indptr[nodes]).sum())
+    return _healthy_neighbors(indptr, indices, nodes, state, healthy, np.empty(total, dtype=indices.dtype))
+
+
+def check_kernels(seed=0):
+    """
+    Compare the compiled kernels with the NumPy implementations on random inputs. Without Numba, the kernels run as
+    plain Python functions, which is slow but checks the same code.
+
+    :param seed: seed of the random inputs
+    :return: dictionary mapping the name of each kernel to True if both implementations give identical results
+    """
+    from simulators.fires.LatticeForest import LatticeForest
+    from simulators.fires.Percolation import sample_burnt_area
+    from simulators.fires.Stencil import neighbor_counts as stencil_counts, stencil_kernel
+    from simulators.graphs.GraphSimulator import GraphSimulator
+
+    global USE_JIT
+    random_state = np.random.RandomState(seed)
+    on_fire = random_state.rand(30, 40) < 0.2
+    forest = LatticeForest(40, rng=seed, neighborhood='moore')
+    for _ in range(10):
+        forest.update()
+    source, target = random_state.randint(0, 2000, size=(2, 6000))
+
+    def run():
+        graph = GraphSimulator(source, target, [0, 1, 2], num_nodes=2000, rng=seed)
+        for _ in range(15):
+            graph.update()
+        return {'neighbor_counts': [stencil_counts(on_fire, stencil_kernel(k)) for k in ['von_neumann', 'moore', 2]],
+                'percolate': sample_burnt_area(forest, 4, random_state=np.random.RandomState(seed)),
+                'graph_step': (graph.state, graph.active_set)}
+
+    enabled = USE_JIT
+    try:
+        USE_JIT = True
+        compiled = run()
+        USE_JIT = False
+        expected = run()
+    finally:
+        USE_JIT = enabled
+
+    return {name: all(np.array_equal(a, b) for a, b in zip(compiled[name], expected[name])) for name in expected}
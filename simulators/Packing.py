@@ -0,0 +1,75 @@
+import numpy as np
+
+
+# number of element states stored in each byte
+STATES_PER_BYTE = 4
+
+
+class PackedState(object):
+    """
+    A simulator state with 2 bits per element, for element state spaces with at most 4 states,
+    such as Tree, SimpleUrban and Region elements.
+    """
+    def __init__(self, data, shape):
+        """
+        :param data: 1D uint8 numpy array with 4 element states per byte
+        :param shape: shape of the unpacked state array
+        """
+        self.data = data
+        self.shape = tuple(shape)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def unpack(self):
+        return unpack_state(self)
+
+    def __eq__(self, other):
+        return isinstance(other, PackedState) and self.shape == other.shape and np.array_equal(self.data, other.data)
+
+    def __repr__(self):
+        return 'PackedState(shape={0}, nbytes={1})'.format(self.shape, self.nbytes)
+
+
+def pack_state(state):
+    """
+    Pack an array of element states into 2 bits per element.
+
+    :param state: numpy array with values in [0, 3]
+    :return: PackedState
+    """
+    state = np.asarray(state)
+    if state.size > 0 and (state.min() < 0 or state.max() > 3):
+        raise ValueError('packed states must be in [0, 3], so at most 4 states per element are supported')
+
+    flat = state.astype(np.uint8).ravel()
+    padded = np.zeros(-(-flat.size // STATES_PER_BYTE)*STATES_PER_BYTE, dtype=np.uint8)
+    padded[:flat.size] = flat
+
+    # element 4*i+k is stored in bits 2*k and 2*k+1 of byte i
+    groups = padded.reshape(-1, STATES_PER_BYTE)
+    data = groups[:, 0] | (groups[:, 1] << 2) | (groups[:, 2] << 4) | (groups[:, 3] << 6)
+    return PackedState(data, state.shape)
+
+
+def unpack_state(packed, dtype=np.uint8):
+    """
+    Unpack a state packed with pack_state.
+
+    :param packed: PackedState
+    :param dtype: numpy dtype of the unpacked array
+    :return: numpy array of element states
+    """
+    size = int(np.prod(packed.shape))
+    groups = (packed.data[:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+    return groups.ravel()[:size].reshape(packed.shape).astype(dtype, copy=False)
+
+
+def as_state_array(state):
+    """
+    Helper function to accept either a packed or an unpacked state.
+
+    :return: numpy array of element states
+    """
+    return unpack_state(state) if isinstance(state, PackedState) else state
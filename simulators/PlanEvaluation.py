@@ -0,0 +1,185 @@
+import numpy as np
+
+from simulators.epidemics.WestAfrica import WestAfrica
+from simulators.fires.LatticeForest import LatticeForest
+from simulators.fires.Percolation import NEIGHBOR_OFFSETS, parameter_arrays
+from simulators.RandomStreams import RandomStreams
+
+
+def _lattice_model(forest):
+    """
+    Helper function to describe a LatticeForest with arrays, see _array_model.
+    """
+    element = next(iter(forest.group.values()))
+    alpha, beta = parameter_arrays(forest)
+    height, width = forest.dims
+    offsets = NEIGHBOR_OFFSETS if forest.neighborhood is None else forest.neighbor_offsets
+
+    def count(active):
+        # counts[..., r, c] is the weighted number of neighbors on fire at offset (dr, dc) from (r, c)
+        active = active.reshape(active.shape[:-1] + (height, width))
+        counts = np.zeros(active.shape)
+        for dr, dc, weight in offsets:
+            if abs(dr) >= height or abs(dc) >= width:
+                continue
+            counts[..., max(-dr, 0):height+min(-dr, 0), max(-dc, 0):width+min(-dc, 0)] += \
+                weight*active[..., max(dr, 0):height+min(dr, 0), max(dc, 0):width+min(dc, 0)]
+        return counts.reshape(counts.shape[:-2] + (-1,))
+
+    keys = [(r, c) for r in range(height) for c in range(width)]
+    return (forest.state.ravel(), alpha.ravel(), 1 - beta.ravel(), count, keys, element.model,
+            (element.healthy, element.on_fire, element.burnt))
+
+
+def _graph_model(simulator):
+    """
+    Helper function to describe a WestAfrica simulator with arrays, see _array_model.
+    """
+    keys = list(simulator.group.keys())
+    index = {name: i for i, name in enumerate(keys)}
+    elements = [simulator.group[name] for name in keys]
+
+    adjacency = np.zeros((len(keys), len(keys)))
+    for i, element in enumerate(elements):
+        for name in element.neighbors:
+            if name in index:
+                adjacency[index[name], i] += 1
+
+    def count(active):
+        return active @ adjacency
+
+    # infected Regions only become immune with control, so the base recovery probability is zero
+    state = np.array([element.state for element in elements], dtype=np.uint8)
+    eta = np.array([element.eta for element in elements], dtype=float)
+    return (state, eta, np.zeros(len(keys)), count, keys, elements[0].model,
+            (elements[0].healthy, elements[0].infected, elements[0].immune))
+
+
+def _array_model(simulator):
+    """
+    Helper function to describe a simulator as a three-state process on arrays.
+
+    :return: tuple (state, propagation, recovery, count, keys, model, states) where state is a 1D array of element
+             states, propagation is the spread parameter (alpha or eta) of each element, recovery is the probability
+             that an active element becomes inactive without control, count maps an array of active indicators
+             of shape (..., number of elements) to the weighted number of active neighbors of each element, keys
+             lists the control key of each element, model is 'linear' or 'exponential', and states is the tuple
+             (healthy, active, inactive) of state values
+    """
+    if isinstance(simulator, LatticeForest):
+        return _lattice_model(simulator)
+    elif isinstance(simulator, WestAfrica):
+        return _graph_model(simulator)
+
+    raise TypeError('plan evaluation supports LatticeForest and WestAfrica simulators')
+
+
+def _control_arrays(plans, keys):
+    """
+    Helper function to convert control plans into arrays of shape (number of plans, number of elements).
+    """
+    index = {key: i for i, key in enumerate(keys)}
+    delta_propagation = np.zeros((len(plans), len(keys)))
+    delta_recovery = np.zeros((len(plans), len(keys)))
+
+    for k, plan in enumerate(plans):
+        default_factory = getattr(plan, 'default_factory', None)
+        if default_factory is not None:
+            delta_propagation[k], delta_recovery[k] = default_factory()
+
+        for key, (delta_a, delta_b) in plan.items():
+            delta_propagation[k, index[key]] = delta_a
+            delta_recovery[k, index[key]] = delta_b
+
+    return delta_propagation, delta_recovery
+
+
+def evaluate_plans(simulator, plans, num_rollouts=100, horizon=10, antithetic=False, outcome=None, z=1.96,
+                   random_state=None):
+    """
+    Estimate the expected outcome of applying each of several candidate control plans to a simulator, starting
+    from its current state. The rollouts for all plans are simulated together with arrays of shape
+    (number of plans, num_rollouts, number of elements).
+
+    All plans use the same random numbers (common random numbers): each element draws one uniform random value per
+    time step and rollout, and changes state if the value is less than its transition probability, as in the
+    simulator. Differences between plans are then due to the plans rather than to sampling noise, so fewer rollouts
+    are needed to rank the plans. With antithetic sampling, the second half of the rollouts uses the values 1-u of
+    the first half, which further reduces the variance of the estimates.
+
+    The simulator is not modified. Parameters are held at their current values for the horizon.
+
+    :param simulator: LatticeForest or WestAfrica simulator
+    :param plans: list of control plans, where each plan is a collection in the same format as the simulator
+                  'update' control, for example mapping (row, col) to (delta_alpha, delta_beta), applied each time step
+    :param num_rollouts: number of rollouts per plan, which must be even for antithetic sampling
+    :param horizon: number of time steps in each rollout
+    :param antithetic: if True, use antithetic pairs of rollouts
+    :param outcome: function that maps an array of final element states of shape (number of plans, num_rollouts,
+                    number of elements) to an array of outcomes of shape (number of plans, num_rollouts).
+                    Elements are ordered by (row, col) for a lattice and as in simulator.group for WestAfrica.
+                    Defaults to the number of healthy elements
+    :param z: width of the confidence intervals in standard errors, 1.96 for a 95% confidence interval
+    :param random_state: numpy RandomState for deterministic sampling, or a RandomStreams object to draw each
+                         time step from its own stream
+    :return: dictionary with entries:
+             mean - expected outcome of each plan
+             std_error - standard error of each mean
+             lower, upper - confidence interval of each mean
+             best - index of the plan with the largest mean
+             difference_std_error - standard error of the difference between each plan and the best plan,
+                                    which is small with common random numbers
+             outcomes - array of outcomes of shape (number of plans, num_rollouts)
+    """
+    if antithetic and num_rollouts % 2 != 0:
+        raise ValueError('antithetic sampling requires an even number of rollouts')
+    if random_state is None:
+        random_state = np.random
+
+    state, propagation, recovery, count, keys, model, (healthy, active, inactive) = _array_model(simulator)
+    delta_propagation, delta_recovery = _control_arrays(plans, keys)
+    delta_propagation, delta_recovery = delta_propagation[:, None, :], delta_recovery[:, None, :]
+
+    states = np.broadcast_to(state, (len(plans), num_rollouts, state.size)).copy()
+    num_draws = num_rollouts//2 if antithetic else num_rollouts
+    for t in range(horizon):
+        is_active = states == active
+        if not is_active.any():
+            break
+
+        if isinstance(random_state, RandomStreams):
+            uniform = random_state.random_state(t).rand(num_draws, state.size)
+        else:
+            uniform = random_state.rand(num_draws, state.size)
+        if antithetic:
+            uniform = np.concatenate([uniform, 1 - uniform])
+
+        # transition probabilities, as in the element dynamics
+        number_active_neighbors = count(is_active)
+        if model == 'linear':
+            p_activate = (propagation - delta_propagation)*number_active_neighbors
+        else:
+            p_activate = 1 - (1 - propagation + delta_propagation)**number_active_neighbors
+        p_deactivate = recovery + delta_recovery
+
+        activate = (states == healthy) & (uniform < p_activate)
+        deactivate = is_active & (uniform < p_deactivate)
+        states[activate] = active
+        states[deactivate] = inactive
+
+    outcomes = np.count_nonzero(states == healthy, axis=-1) if outcome is None else outcome(states)
+    outcomes = np.asarray(outcomes, dtype=float)
+
+    # antithetic pairs are averaged first, since the rollouts in a pair are not independent
+    samples = (outcomes[:, :num_draws] + outcomes[:, num_draws:])/2 if antithetic else outcomes
+    num_samples = samples.shape[1]
+
+    mean = samples.mean(axis=1)
+    std_error = samples.std(axis=1, ddof=1)/np.sqrt(num_samples) if num_samples > 1 else np.full(len(plans), np.inf)
+    best = int(np.argmax(mean))
+    difference = samples - samples[best]
+    difference_std_error = (difference.std(axis=1, ddof=1)/np.sqrt(num_samples) if num_samples > 1
+                            else np.full(len(plans), np.inf))
+
+    return {'mean': mean, 'std_error': std_error, 'lower': mean - z*std_error, 'upper': mean + z*std_error,
+            'best': best, 'difference_std_error': difference_std_error, 'outcomes': outcomes}
@@ -0,0 +1,65 @@
+import numpy as np
+
+
+class RandomStreams(object):
+    """
+    Independent and reproducible random number streams derived from a single seed. Each stream is identified by a
+    key, a tuple of non-negative integers such as (replica, tile, time step), and only depends on the seed and the
+    key. Results therefore do not depend on how replicas, tiles or samples are divided between workers or batches.
+    """
+    def __init__(self, seed, key=()):
+        """
+        :param seed: non-negative integer seed shared by all streams
+        :param key: key prefix for all streams created by this object
+        """
+        self.seed = seed
+        self.key = tuple(int(k) for k in key)
+
+    def spawn(self, *key):
+        """
+        Create a RandomStreams object whose keys are prefixed by key, for example to assign streams to a replica.
+        """
+        return RandomStreams(self.seed, self.key + key)
+
+    def seed_sequence(self, *key):
+        """
+        Create the numpy SeedSequence for a stream.
+        """
+        return np.random.SeedSequence(self.seed, spawn_key=self.key + tuple(int(k) for k in key))
+
+    def random_state(self, *key):
+        """
+        Create a numpy RandomState for a stream, which supports the same methods as a RandomState created from a seed.
+        """
+        return np.random.RandomState(np.random.PCG64(self.seed_sequence(*key)))
+
+    def __repr__(self):
+        return 'RandomStreams(seed={0}, key={1})'.format(self.seed, self.key)
+
+
+def make_random_state(rng, *key):
+    """
+    Create a numpy RandomState from a simulator 'rng' argument.
+
+    :param rng: None, an integer seed, or a RandomStreams object
+    :param key: stream key, only used if rng is a RandomStreams object
+    :return: numpy RandomState
+    """
+    if isinstance(rng, RandomStreams):
+        return rng.random_state(*key)
+    return np.random.RandomState(rng)
+
+
+def step_random_state(rng, iteration, random_state):
+    """
+    Select the RandomState for a simulator time step. With a RandomStreams object, each time step uses its own stream,
+    so results do not depend on how earlier time steps were sampled. Otherwise, random_state is used for every step.
+
+    :param rng: None, an integer seed, or a RandomStreams object
+    :param iteration: time step
+    :param random_state: RandomState used when rng is not a RandomStreams object
+    :return: numpy RandomState
+    """
+    if isinstance(rng, RandomStreams):
+        return rng.random_state(iteration)
+    return random_state
@@ -0,0 +1,340 @@
+import asyncio
+from collections import defaultdict
+import json
+import socket
+import struct
+import numpy as np
+
+from simulators.Packing import pack_state, PackedState
+from simulators.VectorSimulator import simulator_stats, state_array
+
+
+# each message is a fixed-size prefix with the header and payload lengths, a JSON header, and a binary payload
+PREFIX = struct.Struct('!II')
+
+
+def encode_message(header, payload=b''):
+    """
+    Encode a message as bytes.
+
+    :param header: JSON serializable dictionary
+    :param payload: bytes
+    """
+    header = json.dumps(header).encode('utf-8')
+    return PREFIX.pack(len(header), len(payload)) + header + payload
+
+
+def _key(key):
+    """
+    Helper function to convert a JSON list into a hashable simulator element key, such as (row, col) for a lattice
+    forest or a Region name for WestAfrica.
+    """
+    return tuple(_key(k) for k in key) if isinstance(key, list) else key
+
+
+def _control(items):
+    """
+    Helper function to convert a JSON list of [key, value] pairs into a control collection, or None.
+    """
+    if items is None:
+        return None
+
+    control = defaultdict(lambda: (0, 0))
+    control.update({_key(key): tuple(value) for key, value in items})
+    return control
+
+
+def _error_message(error):
+    """
+    Helper function to encode the response to a request that raised an exception.
+    """
+    return encode_message({'ok': False, 'error': '{0}: {1}'.format(type(error).__name__, error)})
+
+
+class SimulationServer(object):
+    """
+    A local asyncio server that hosts simulator instances shared by many client processes.
+
+    Requests are queued in arrival order and processed in batches in a worker thread, so that the event loop remains
+    responsive. A batch contains every request queued while the previous batch was executed, and optionally the
+    requests that arrive within batch_window seconds. Batching shares the cost of switching to the worker thread
+    between clients; the requests in a batch are still executed one at a time, in arrival order.
+
+    Supported operations, see SimulationClient for the request format:
+        step - update a simulator one time step, with an optional control
+        reset - reset a simulator to its initial configuration
+        query - return the time step, termination flag and statistics of a simulator
+        snapshot - query, and return the state of every element as a binary payload
+        observe - return local observation patches as a binary payload, for LatticeForest and UrbanForest
+
+    States can be requested with 'packed' set to True, in which case each element state is sent as 2 bits.
+    """
+    def __init__(self, simulators, path=None, host='127.0.0.1', port=0, batch_window=0):
+        """
+        :param simulators: dictionary mapping names to Simulator objects
+        :param path: path of a Unix socket, if None a TCP socket is used instead
+        :param host: TCP host, localhost by default
+        :param port: TCP port, 0 to select a free port
+        :param batch_window: time in seconds to wait for additional requests before processing a batch, 0 to process
+                             queued requests without waiting
+        """
+        self.simulators = simulators
+        self.path = path
+        self.host = host
+        self.port = port
+        self.batch_window = batch_window
+
+        self.server = None
+        self.queue = None
+        self.batcher = None
+        self.address = None
+
+    async def start(self):
+        """
+        Start accepting connections.
+
+        :return: socket path or (host, port) address of the server
+        """
+        self.queue = asyncio.Queue()
+        self.batcher = asyncio.ensure_future(self._process_batches())
+
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(self._handle_client, path=self.path)
+            self.address = self.path
+        else:
+            self.server = await asyncio.start_server(self._handle_client, host=self.host, port=self.port)
+            self.address = self.server.sockets[0].getsockname()[:2]
+
+        return self.address
+
+    async def serve_forever(self):
+        """
+        Start the server, if needed, and process requests until cancelled.
+        """
+        if self.server is None:
+            await self.start()
+        await self.server.serve_forever()
+
+    async def close(self):
+        """
+        Stop accepting connections and stop processing requests.
+        """
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+
+    async def _handle_client(self, reader, writer):
+        """
+        Helper method to read requests from a client connection. Each request is answered in order.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    header_size, payload_size = PREFIX.unpack(await reader.readexactly(PREFIX.size))
+                except asyncio.IncompleteReadError:
+                    break
+
+                request = json.loads((await reader.readexactly(header_size)).decode('utf-8'))
+                await reader.readexactly(payload_size)
+
+                response = loop.create_future()
+                await self.queue.put((request, response))
+                writer.write(await response)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _process_batches(self):
+        """
+        Helper method to collect queued requests into batches and execute each batch in a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            if self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            # an unexpected error is returned to every client in the batch, so that no client waits forever
+            try:
+                messages = await loop.run_in_executor(None, self._execute, [request for request, _ in batch])
+            except Exception as error:
+                messages = [_error_message(error)]*len(batch)
+
+            for (_, response), message in zip(batch, messages):
+                if not response.done():
+                    response.set_result(message)
+
+    def _execute(self, requests):
+        """
+        Helper method to execute a batch of requests in arrival order. Each request is executed separately, so its
+        response describes only what happened to its own simulator.
+
+        :return: list of encoded response messages
+        """
+        messages = []
+        for request in requests:
+            try:
+                messages.append(self._execute_request(request))
+            except Exception as error:
+                messages.append(_error_message(error))
+
+        return messages
+
+    def _execute_request(self, request):
+        """
+        Helper method to execute a single request.
+        """
+        if not isinstance(request, dict) or 'op' not in request:
+            raise ValueError('request must be a JSON object with an operation')
+
+        operation = request['op']
+        if operation == 'list':
+            return encode_message({'ok': True, 'simulators': sorted(self.simulators.keys())})
+
+        simulator = self.simulators[request['sim']]
+        payload = b''
+
+        if operation == 'step':
+            simulator.update(_control(request.get('control')))
+
+        elif operation == 'reset':
+            simulator.reset()
+
+        elif operation == 'observe':
+            payload = simulator.observe_patches(request['positions'], request['size'],
+                                                pad_value=request.get('pad_value', -1))
+
+        elif operation not in ['query', 'snapshot']:
+            raise ValueError('unknown operation {0}'.format(operation))
+
+        return self._response(simulator, request, payload)
+
+    def _response(self, simulator, request, payload=b''):
+        """
+        Helper method to encode the response to a request after it is executed.
+        """
+        operation = request['op']
+        header = {'ok': True, 'iter': simulator.iter, 'end': bool(simulator.end),
+                  'stats': simulator_stats(simulator).tolist()}
+
+        if operation in ['step', 'reset', 'snapshot'] and request.get('state', operation == 'snapshot'):
+            payload = state_array(simulator)
+            if request.get('packed', False):
+                packed = pack_state(payload)
+                header['packed'] = True
+                header['shape'] = list(packed.shape)
+                payload = packed.data.tobytes()
+
+        if isinstance(payload, np.ndarray):
+            header['dtype'] = payload.dtype.str
+            header['shape'] = list(payload.shape)
+            payload = payload.tobytes()
+
+        return encode_message(header, payload)
+
+
+class SimulationClient(object):
+    """
+    A blocking client for a SimulationServer, which can be used from any process on the same machine.
+    """
+    def __init__(self, address):
+        """
+        :param address: socket path or (host, port) address returned by SimulationServer.start
+        """
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            address = tuple(address)
+        self.socket.connect(address)
+
+    def close(self):
+        self.socket.close()
+
+    def _receive(self, size):
+        """
+        Helper method to read an exact number of bytes from the socket.
+        """
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.socket.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('connection closed by server')
+            data.extend(chunk)
+        return bytes(data)
+
+    def request(self, header):
+        """
+        Send a request and wait for the response.
+
+        :param header: JSON serializable dictionary describing the request
+        :return: tuple (header, array) where array is the decoded binary payload, a PackedState for a packed state,
+                 or None if there is no payload
+        """
+        self.socket.sendall(encode_message(header))
+        header_size, payload_size = PREFIX.unpack(self._receive(PREFIX.size))
+        response = json.loads(self._receive(header_size).decode('utf-8'))
+        payload = self._receive(payload_size)
+
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+
+        array = None
+        if response.get('packed', False):
+            array = PackedState(np.frombuffer(payload, dtype=np.uint8), response['shape'])
+        elif 'dtype' in response:
+            array = np.frombuffer(payload, dtype=np.dtype(response['dtype'])).reshape(response['shape'])
+        return response, array
+
+    def list(self):
+        """
+        :return: list of simulator names hosted by the server
+        """
+        return self.request({'op': 'list'})[0]['simulators']
+
+    def step(self, name, control=None, state=False, packed=False):
+        """
+        Update a simulator one time step.
+
+        :param name: simulator name
+        :param control: dictionary mapping element keys, such as (row, col), to a control tuple
+        :param state: if True, the state of every element is returned
+        :param packed: if True, the state is sent and returned as a PackedState
+        :return: tuple (header, state) where header contains 'iter', 'end' and 'stats'
+        """
+        if control is not None:
+            control = [[list(key) if isinstance(key, tuple) else key, list(value)] for key, value in control.items()]
+        return self.request({'op': 'step', 'sim': name, 'control': control, 'state': state,
+                             'packed': packed})
+
+    def reset(self, name, state=False, packed=False):
+        """
+        Reset a simulator to its initial configuration.
+        """
+        return self.request({'op': 'reset', 'sim': name, 'state': state, 'packed': packed})
+
+    def query(self, name):
+        """
+        :return: dictionary with 'iter', 'end' and 'stats' of a simulator
+        """
+        return self.request({'op': 'query', 'sim': name})[0]
+
+    def snapshot(self, name, packed=False):
+        """
+        :return: tuple (header, state) where state is the state of every element, as a PackedState if packed is True
+        """
+        return self.request({'op': 'snapshot', 'sim': name, 'packed': packed})
+
+    def observe(self, name, positions, size, pad_value=-1):
+        """
+        Request local observation patches, see LatticeForest.observe_patches.
+
+        :return: 3D numpy array of shape (number of positions, height, width)
+        """
+        positions = np.asarray(positions).tolist()
+        return self.request({'op': 'observe', 'sim': name, 'positions': positions, 'size': size,
+                             'pad_value': pad_value})[1]
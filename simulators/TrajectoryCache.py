@@ -0,0 +1,263 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import numpy as np
+
+from simulators.Checkpoint import read_archive, save_archive
+from simulators.Packing import pack_state, PackedState
+
+
+# element state after each type of change reported by a simulator update, see LatticeForest.update,
+# UrbanForest.update and WestAfrica.update
+CHANGE_STATES = {'ignited': 1, 'burnt': 2, 'removed': 3, 'infected': 1, 'immune': 2}
+
+
+def _canonical(value):
+    """
+    Helper function to convert a configuration into JSON serializable data, with numpy arrays replaced by a digest.
+    """
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        return {'dtype': array.dtype.str, 'shape': list(array.shape), 'sha1': hashlib.sha1(array.data).hexdigest()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, dict):
+        return sorted([json.dumps(_canonical(k), sort_keys=True), _canonical(v)] for k, v in value.items())
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def _nbytes(value):
+    """
+    Helper function to approximate the memory use of a snapshot in bytes.
+    """
+    if isinstance(value, (np.ndarray, PackedState)):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(k) + _nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 8*len(value) + sum(_nbytes(v) for v in value)
+    return 8
+
+
+def trajectory_key(config, initial, seed):
+    """
+    Create a cache key for a trajectory.
+
+    :param config: description of the simulator configuration, such as a dictionary with the class name, dimension
+                   and parameters. Numpy arrays are included by their contents
+    :param initial: initial fire or outbreak, such as a list of (row, col) positions or a dictionary of Region names
+    :param seed: random number generator seed
+    :return: hexadecimal string
+    """
+    description = json.dumps(_canonical([config, initial, seed]), sort_keys=True)
+    return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+
+class Trajectory(object):
+    """
+    A compact encoding of a simulator trajectory: the packed initial state, followed by the elements that changed
+    state in each time step, and the final snapshot so that the simulation can be continued with 'restore'.
+    """
+    def __init__(self, initial, indices, states, offsets, final_snapshot=None):
+        """
+        :param initial: PackedState of the initial element states
+        :param indices: 1D int64 numpy array of flattened indices of the elements that changed state, for all steps
+        :param states: 1D uint8 numpy array with the state of each element after it changed
+        :param offsets: 1D int64 numpy array, where the changes of step t are indices[offsets[t]:offsets[t+1]]
+        :param final_snapshot: snapshot of the simulator after the last step, with a packed state
+        """
+        self.initial = initial
+        self.indices = indices
+        self.states = states
+        self.offsets = offsets
+        self.final_snapshot = final_snapshot
+
+    @classmethod
+    def record(cls, simulator, num_steps, control=None):
+        """
+        Record a trajectory by updating a simulator from its current state.
+
+        :param simulator: LatticeForest, UrbanForest or WestAfrica simulator
+        :param num_steps: maximum number of time steps, fewer if the simulation ends
+        :param control: control applied each time step, None for no control
+        """
+        initial = pack_state(simulator.snapshot()['state'])
+        indices, states, offsets = [], [], [0]
+        for _ in range(num_steps):
+            if simulator.end:
+                break
+
+            changes = simulator.update(control, return_changes=True)
+            for name, changed in changes.items():
+                indices.append(changed)
+                states.append(np.full(changed.size, CHANGE_STATES[name], dtype=np.uint8))
+            offsets.append(offsets[-1] + sum(changed.size for changed in changes.values()))
+
+        return cls(initial, np.concatenate(indices or [np.zeros(0, dtype=np.int64)]).astype(np.int64),
+                   np.concatenate(states or [np.zeros(0, dtype=np.uint8)]), np.array(offsets, dtype=np.int64),
+                   simulator.snapshot(packed=True))
+
+    def __len__(self):
+        """
+        Number of time steps in the trajectory.
+        """
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory use in bytes.
+        """
+        size = self.initial.nbytes + self.indices.nbytes + self.states.nbytes + self.offsets.nbytes
+        if self.final_snapshot is not None:
+            size += _nbytes(self.final_snapshot)
+        return size
+
+    def step_changes(self, t):
+        """
+        :return: tuple (indices, states) of the elements that changed state in time step t, starting from 0
+        """
+        return self.indices[self.offsets[t]:self.offsets[t+1]], self.states[self.offsets[t]:self.offsets[t+1]]
+
+    def state(self, t):
+        """
+        :return: numpy array of element states after t time steps
+        """
+        state = self.initial.unpack()
+        flat = state.reshape(-1)
+        flat[self.indices[:self.offsets[t]]] = self.states[:self.offsets[t]]
+        return state
+
+    def iter_states(self):
+        """
+        Generate the element states for every time step, starting with the initial state. The same array is
+        modified in place and yielded each time step, so it should be copied to keep it.
+        """
+        state = self.initial.unpack()
+        flat = state.reshape(-1)
+        yield state
+        for t in range(len(self)):
+            indices, states = self.step_changes(t)
+            flat[indices] = states
+            yield state
+
+    def restore(self, simulator):
+        """
+        Set a simulator to the end of the trajectory, including its random number generator state, so that the
+        simulation can be continued. The simulator should be created with the same configuration.
+        """
+        simulator.restore(self.final_snapshot)
+        return simulator
+
+    def to_dict(self):
+        return {'initial': self.initial, 'indices': self.indices, 'states': self.states, 'offsets': self.offsets,
+                'final_snapshot': self.final_snapshot}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['initial'], data['indices'], data['states'], data['offsets'], data['final_snapshot'])
+
+
+class TrajectoryCache(object):
+    """
+    A cache of recently used trajectories, for example to replay the uncontrolled start of training episodes
+    instead of simulating it again. Trajectories are kept in memory up to a memory budget, and the least recently
+    used trajectories are evicted first. If a directory is given, evicted trajectories are saved to disk and loaded
+    again when requested.
+    """
+    def __init__(self, memory_budget=256*2**20, directory=None):
+        """
+        :param memory_budget: maximum memory use of the trajectories kept in memory, in bytes
+        :param directory: directory for the on-disk tier, None to discard evicted trajectories
+        """
+        self.memory_budget = memory_budget
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        self.trajectories = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.trajectories)
+
+    def __contains__(self, key):
+        return key in self.trajectories or (self.directory is not None and os.path.exists(self._path(key)))
+
+    def _path(self, key):
+        return os.path.join(self.directory, '{0}.npz'.format(key))
+
+    def get(self, key):
+        """
+        :return: the Trajectory for a key, or None if it is not in the cache
+        """
+        if key in self.trajectories:
+            self.trajectories.move_to_end(key)
+            self.hits += 1
+            return self.trajectories[key]
+
+        if self.directory is not None and os.path.exists(self._path(key)):
+            _, data = read_archive(self._path(key))
+            trajectory = Trajectory.from_dict(data)
+            self.disk_hits += 1
+            self._insert(key, trajectory)
+            return trajectory
+
+        self.misses += 1
+        return None
+
+    def put(self, key, trajectory):
+        """
+        Add a trajectory to the cache, replacing any trajectory with the same key in memory or on disk.
+        """
+        if key in self.trajectories:
+            self.nbytes -= self.trajectories.pop(key).nbytes
+        if self.directory is not None and os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+        self._insert(key, trajectory)
+        return
+
+    def _insert(self, key, trajectory):
+        """
+        Helper method to add a trajectory in memory and evict the least recently used trajectories over the budget.
+        The most recent trajectory is kept even if it is larger than the budget.
+        """
+        self.trajectories[key] = trajectory
+        self.nbytes += trajectory.nbytes
+
+        while self.nbytes > self.memory_budget and len(self.trajectories) > 1:
+            evicted_key, evicted = self.trajectories.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+            if self.directory is not None and not os.path.exists(self._path(evicted_key)):
+                save_archive(self._path(evicted_key), 'Trajectory', evicted.to_dict())
+        return
+
+    def rollout(self, make_simulator, config, initial, seed, num_steps, control=None):
+        """
+        Get a trajectory from the cache, or record it and add it to the cache.
+
+        :param make_simulator: function without arguments that creates the simulator described by config, initial
+                               and seed, only called if the trajectory is not in the cache
+        :param config: simulator configuration, see trajectory_key
+        :param initial: initial fire or outbreak, see trajectory_key
+        :param seed: random number generator seed, see trajectory_key
+        :param num_steps: maximum number of time steps
+        :param control: control applied each time step, which should be included in config if it is not None
+        :return: Trajectory
+        """
+        key = trajectory_key([config, num_steps], initial, seed)
+        trajectory = self.get(key)
+        if trajectory is None:
+            trajectory = Trajectory.record(make_simulator(), num_steps, control)
+            self.put(key, trajectory)
+        return trajectory
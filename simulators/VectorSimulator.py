@@ -0,0 +1,222 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+
+def simulator_stats(simulator):
+    """
+    Collect the statistics counters of a simulator into a single 1D array.
+    For an UrbanForest, the Tree statistics are followed by the SimpleUrban statistics.
+    For a simulator without statistics counters, such as WestAfrica, the number of elements in each state is used.
+    """
+    if hasattr(simulator, 'stats_trees'):
+        return np.concatenate([simulator.stats_trees, simulator.stats_urban])
+    if hasattr(simulator, 'stats'):
+        return np.asarray(simulator.stats)
+
+    element = next(iter(simulator.group.values()))
+    states = [e.state for e in simulator.group.values()]
+    return np.bincount(states, minlength=len(element.state_space))
+
+
+def state_array(simulator):
+    """
+    Represent the state of a simulator as a numpy array, keeping the simulator's dtype. For a WestAfrica simulator,
+    Regions are ordered as in simulator.group. For a MeanFieldForest, this is the fraction of Trees in each state
+    for each block.
+    """
+    if isinstance(getattr(simulator, 'state', None), np.ndarray):
+        return simulator.state
+    if getattr(simulator, 'group', None):
+        return np.array([element.state for element in simulator.group.values()], dtype=np.uint8)
+
+    state = simulator.dense_state()
+    if not isinstance(state, np.ndarray):
+        raise TypeError('{0} does not provide an array state'.format(type(simulator).__name__))
+    return state
+
+
+def _step_simulators(simulators, controls, observations, auto_reset):
+    """
+    Helper function to step a collection of simulators and write their observations in place.
+    """
+    stats = []
+    dones = np.zeros(len(simulators), dtype=bool)
+    for k, (simulator, control) in enumerate(zip(simulators, controls)):
+        simulator.update(control)
+        stats.append(simulator_stats(simulator))
+        dones[k] = simulator.end
+
+        if dones[k] and auto_reset:
+            simulator.reset()
+        observations[k] = state_array(simulator)
+
+    return np.stack(stats), dones
+
+
+def _worker(make_simulator, indices, buffer_name, shape, dtype, auto_reset, connection):
+    """
+    Worker process loop for the subprocess backend. Observations are written directly to shared memory,
+    only statistics and termination flags are sent through the pipe.
+    """
+    buffer = shared_memory.SharedMemory(name=buffer_name)
+    observations = np.ndarray(shape, dtype=dtype, buffer=buffer.buf)[indices[0]:indices[-1]+1]
+    simulators = [make_simulator(k) for k in indices]
+
+    try:
+        while True:
+            command, data = connection.recv()
+
+            if command == 'step':
+                connection.send(_step_simulators(simulators, data, observations, auto_reset))
+
+            elif command == 'reset':
+                for k, simulator in enumerate(simulators):
+                    simulator.reset()
+                    observations[k] = state_array(simulator)
+                connection.send(np.stack([simulator_stats(simulator) for simulator in simulators]))
+
+            elif command == 'close':
+                break
+    finally:
+        del observations
+        buffer.close()
+        connection.close()
+
+
+class VectorSimulator(object):
+    """
+    Step a collection of simulators in lockstep with a single call, for example to generate data for training
+    a reinforcement learning agent with many LatticeForest environments.
+
+    Simulators that terminate are reset automatically. The simulators can be stepped serially in this process,
+    or in parallel by worker processes that write observations to shared memory.
+    """
+    def __init__(self, make_simulator, num_simulators, backend='serial', num_workers=None, auto_reset=True):
+        """
+        Initializes a vectorized simulation object.
+
+        :param make_simulator: function that takes an index in [0, num_simulators) and returns a Simulator,
+                               for example to assign a different seed to each simulator.
+                               For the 'subprocess' backend, the function must be picklable
+        :param num_simulators: number of simulators
+        :param backend: 'serial' to step simulators in this process,
+                        or 'subprocess' to step simulators in parallel worker processes
+        :param num_workers: number of worker processes for the 'subprocess' backend, defaults to the number of CPUs
+        :param auto_reset: if True, a simulator is reset in the same step that it terminates
+        """
+        self.num_simulators = num_simulators
+        self.backend = backend
+        self.auto_reset = auto_reset
+
+        # the observation shape and dtype are determined from one simulator in this process
+        simulator = make_simulator(0)
+        observation = state_array(simulator)
+        self.observation_shape = observation.shape
+        self.observation_dtype = observation.dtype
+        self.observations = None
+
+        if backend == 'serial':
+            self.simulators = [simulator] + [make_simulator(k) for k in range(1, num_simulators)]
+            self.observations = np.zeros((num_simulators,) + self.observation_shape, dtype=self.observation_dtype)
+
+        elif backend == 'subprocess':
+            del simulator
+            num_workers = min(num_workers or mp.cpu_count(), num_simulators)
+            shape = (num_simulators,) + self.observation_shape
+
+            size = int(np.prod(shape))*self.observation_dtype.itemsize
+            self._buffer = shared_memory.SharedMemory(create=True, size=max(size, 1))
+            self.observations = np.ndarray(shape, dtype=self.observation_dtype, buffer=self._buffer.buf)
+
+            # assign a contiguous range of simulators to each worker
+            context = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+            self._connections = []
+            self._workers = []
+            for indices in np.array_split(np.arange(num_simulators), num_workers):
+                parent, child = context.Pipe()
+                worker = context.Process(target=_worker, daemon=True,
+                                         args=(make_simulator, indices.tolist(), self._buffer.name, shape,
+                                               self.observation_dtype, auto_reset, child))
+                worker.start()
+                child.close()
+                self._connections.append((parent, indices.tolist()))
+                self._workers.append(worker)
+
+        else:
+            raise ValueError("backend must be 'serial' or 'subprocess'")
+
+        self.closed = False
+        return
+
+    def reset(self):
+        """
+        Reset every simulator to its initial configuration.
+
+        :return: tuple (observations, stats) where observations has shape (num_simulators, ...) and
+                 stats has one row of statistics per simulator
+        """
+        if self.backend == 'serial':
+            for k, simulator in enumerate(self.simulators):
+                simulator.reset()
+                self.observations[k] = state_array(simulator)
+            stats = np.stack([simulator_stats(simulator) for simulator in self.simulators])
+
+        else:
+            for connection, _ in self._connections:
+                connection.send(('reset', None))
+            stats = np.concatenate([connection.recv() for connection, _ in self._connections])
+
+        return self.observations.copy(), stats
+
+    def step(self, controls=None):
+        """
+        Update every simulator one time step.
+
+        :param controls: sequence with one control per simulator, in the format expected by the simulator
+                         'update' method, or None to apply no control to any simulator
+        :return: tuple (observations, stats, dones):
+                 observations - array of shape (num_simulators, ...) with the state of each simulator.
+                                If a simulator terminated and auto_reset is True, this is the state after reset
+                 stats - array with one row of statistics per simulator, computed before any reset
+                 dones - boolean array indicating which simulators terminated this step
+        """
+        if controls is None:
+            controls = [None]*self.num_simulators
+
+        if self.backend == 'serial':
+            stats, dones = _step_simulators(self.simulators, controls, self.observations, self.auto_reset)
+
+        else:
+            for connection, indices in self._connections:
+                connection.send(('step', [controls[k] for k in indices]))
+            results = [connection.recv() for connection, _ in self._connections]
+            stats = np.concatenate([r[0] for r in results])
+            dones = np.concatenate([r[1] for r in results])
+
+        return self.observations.copy(), stats, dones
+
+    def close(self):
+        """
+        Stop the worker processes and release shared memory.
+        """
+        if self.closed:
+            return
+
+        if self.backend == 'subprocess':
+            for connection, _ in self._connections:
+                connection.send(('close', None))
+                connection.close()
+            for worker in self._workers:
+                worker.join()
+
+            self.observations = None
+            self._buffer.close()
+            self._buffer.unlink()
+
+        self.closed = True
+        return
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
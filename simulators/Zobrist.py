@@ -0,0 +1,60 @@
+import numpy as np
+import weakref
+
+
+# random tables shared by all ZobristHash objects with the same shape, number of states and seed. A table is released
+# when no ZobristHash uses it, and the same table is generated again from the seed if needed
+_TABLES = weakref.WeakValueDictionary()
+
+
+class ZobristHash(object):
+    """
+    A 64-bit hash of the states of a collection of elements, updated in constant time when one element changes state,
+    for example to key a transposition table. Each (element, state) pair is assigned a random 64-bit value, and the
+    hash is the exclusive or of the values of the current state of every element. The value of state 0 is zero, so
+    elements in state 0 do not contribute to the hash.
+
+    Simulators with the same shape, number of states and seed use the same table, so their hashes can be compared.
+    """
+    def __init__(self, shape, num_states, seed=0, state=None):
+        """
+        :param shape: shape of the element state array, for example (height, width) for a lattice
+        :param num_states: number of states of each element
+        :param seed: seed of the random table
+        :param state: initial element states, None if every element is in state 0
+        """
+        self.shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        key = (self.shape, num_states, seed)
+        self.table = _TABLES.get(key)
+        if self.table is None:
+            self.table = np.random.RandomState(seed).randint(0, 2**64, size=self.shape + (num_states-1,),
+                                                             dtype=np.uint64)
+            _TABLES[key] = self.table
+        self.value = np.uint64(0 if state is None else self.compute(state))
+
+    def transition(self, position, state, next_state):
+        """
+        Update the hash for an element that changes state.
+
+        :param position: index of the element in the state array, such as (row, col)
+        """
+        if state != 0:
+            self.value ^= self.table[position][state-1]
+        if next_state != 0:
+            self.value ^= self.table[position][next_state-1]
+        return
+
+    def compute(self, state):
+        """
+        Calculate the hash of a state array from scratch.
+
+        :param state: numpy array of element states with the same shape as the table
+        :return: integer hash
+        """
+        state = np.asarray(state)
+        indices = np.nonzero(state)
+        values = self.table[indices + (state[indices].astype(np.int64)-1,)]
+        return int(np.bitwise_xor.reduce(values, initial=np.uint64(0)))
+
+    def __int__(self):
+        return int(self.value)
@@ -52,7 +52,7 @@ class Region(Element):
         self.state = self.next_state
         return
 
-    def next(self, group, control=(0, 0)):
+    def next(self, group, control=(0, 0), random_state=None):
         """
         Sample and set the next state. Simplifies implementation of a Markov process.
         """
@@ -68,7 +68,12 @@ class Region(Element):
 
             # calculate transition probability and sample
             transition_p = self.dynamics((self.state, number_neighbors_on_fire, self.state+1), control)
-            if np.random.rand() < transition_p:
+            if random_state is None:
+                random_value = np.random.rand()
+            else:
+                random_value = random_state.rand()
+
+            if random_value < transition_p:
                 self.next_state = self.state + 1
 
     def query_neighbors(self, group):
@@ -4,7 +4,10 @@ import pickle
 import pkgutil
 
 from simulators.epidemics.RegionElements import Region
+from simulators.Packing import as_state_array, pack_state
+from simulators.RandomStreams import RandomStreams, step_random_state
 from simulators.Simulator import Simulator
+from simulators.Zobrist import ZobristHash
 
 
 class WestAfrica(Simulator):
@@ -18,7 +21,8 @@ class WestAfrica(Simulator):
 
         :param initial_outbreak: dictionary describing the Regions that are initially infected.
                                  Each key should return a count of how long the Region has been infected.
-        :param rng: random number generator seed for deterministic sampling
+        :param rng: random number generator seed for deterministic sampling, which seeds the global numpy random
+                    number generator, or a RandomStreams object to sample each time step from its own stream
         :param eta: disease propagation parameter, as a dictionary with Region name as keys
         :param region_model: simulation model for Region elements, either 'linear' or 'exponential'
         """
@@ -39,6 +43,9 @@ class WestAfrica(Simulator):
         self.dims = len(graph.keys())
         self.initial_outbreak = initial_outbreak
 
+        # hash of the state of each Region, created by state_hash
+        self.zobrist = None
+
         # create a collection of Regions based on provided graph
         self.group = dict()
         self.counter = dict()  # a count of how long each Region has been in the infected state
@@ -54,34 +61,90 @@ class WestAfrica(Simulator):
                 self.counter[name] = self.initial_outbreak[name]
 
         self.rng = rng
-        if rng is not None:
+        if rng is not None and not isinstance(rng, RandomStreams):
             np.random.seed(rng)
 
         self.iter = 0
         self.end = False
+
+        # numeric ids of the Regions that changed state in the last time step
+        self.changes = {'infected': np.zeros(0, dtype=np.int64), 'immune': np.zeros(0, dtype=np.int64)}
+
+        # the initial configuration, and the names of Regions whose state differs from it
+        self.initial_snapshot = self.snapshot()
+        self.changed = set()
         return
 
     def reset(self):
         """
         Reset simulation object to initialization.
+        Only the Regions whose state changed since initialization are modified.
         """
-        # reset Regions and counter
-        for name in self.group.keys():
-            self.group[name].reset()
-            self.counter[name] = 0
+        self._restore(self.initial_snapshot, self.changed | set(self.initial_outbreak.keys()))
+        self.changed = set()
+        return
 
-            # reset to initial outbreak
-            if name in self.initial_outbreak.keys():
-                self.group[name].set_infected()
-                self.counter[name] = self.initial_outbreak[name]
+    def snapshot(self, packed=False):
+        """
+        Create a copy of the simulation state. If a seed was provided, the state of the global numpy random
+        number generator is included.
+
+        :param packed: if True, the state of each Region is packed into 2 bits, see pack_state
+        :return: dictionary describing the simulation state, which can be applied with 'restore'
+        """
+        state = np.array([element.state for element in self.group.values()], dtype=np.uint8)
+        return {'state': pack_state(state) if packed else state,
+                'counter': dict(self.counter), 'iter': self.iter, 'end': self.end,
+                'hash': None if self.zobrist is None else int(self.zobrist),
+                'random_state': (np.random.get_state()
+                                 if self.rng is not None and not isinstance(self.rng, RandomStreams) else None)}
+
+    def restore(self, snapshot):
+        """
+        Set the simulation state from a snapshot created by 'snapshot', with a packed or unpacked state.
+        """
+        snapshot = dict(snapshot, state=as_state_array(snapshot['state']))
+        self._restore(snapshot, self.group.keys())
+        state = self.snapshot()['state']
+        self.changed = set(name for name, changed in zip(self.group.keys(), state != self.initial_snapshot['state'])
+                           if changed)
+        return
 
-        if self.rng is not None:
-            np.random.seed(self.rng)
+    def _restore(self, snapshot, names):
+        """
+        Helper method to set the simulation state from a snapshot.
 
-        self.iter = 0
-        self.end = False
+        :param snapshot: dictionary created by 'snapshot'
+        :param names: collection of names of Regions whose state or counter may differ from the snapshot
+        """
+        for name in names:
+            element = self.group[name]
+            state = int(snapshot['state'][element.numeric_id])
+            if self.zobrist is not None:
+                self.zobrist.transition(element.numeric_id, element.state, state)
+            element.state = state
+            element.next_state = element.state
+            self.counter[name] = snapshot['counter'][name]
+
+        self.iter = snapshot['iter']
+        self.changes = {'infected': np.zeros(0, dtype=np.int64), 'immune': np.zeros(0, dtype=np.int64)}
+        self.end = snapshot['end']
+        if snapshot['random_state'] is not None:
+            np.random.set_state(snapshot['random_state'])
         return
 
+    def state_hash(self):
+        """
+        Hash of the state of every Region, which does not depend on the time step. The hash is computed on the first
+        call and maintained incrementally afterwards.
+
+        :return: 64-bit integer, see ZobristHash
+        """
+        if self.zobrist is None:
+            state = np.array([element.state for element in self.group.values()], dtype=np.uint8)
+            self.zobrist = ZobristHash(self.dims, 3, state=state)
+        return int(self.zobrist.value)
+
     def dense_state(self):
         """
         Create a representation of the state of each Region.
@@ -90,12 +153,15 @@ class WestAfrica(Simulator):
         """
         return {name: self.group[name].state for name in self.group.keys()}
 
-    def update(self, control=None):
+    def update(self, control=None, return_changes=False):
         """
-        Update the simulator one time step.
+        Update the simulator one time step. The Regions that changed state are stored in self.changes.
 
         :param control: collection to map Region name to control for each Region,
                         which is a tuple of (delta_eta, delta_nu)
+        :param return_changes: if True, return self.changes
+        :return: None, or a dictionary with the numeric ids of the Regions that became infected ('infected') and
+                 immune ('immune') this time step
         """
         if self.end:
             print('process has terminated')
@@ -103,20 +169,35 @@ class WestAfrica(Simulator):
         if control is None:
             control = defaultdict(lambda: (0, 0))
 
+        # without random number streams, Regions sample from the global numpy random number generator
+        random_state = step_random_state(self.rng, self.iter, None)
+
         # determine next state for each Region
         for name in self.group.keys():
-            self.group[name].next(self.group, control[name])
+            self.group[name].next(self.group, control[name], random_state)
 
         # assume simulation will end this time step
         self.end = True
+        infected, immune = [], []
         for name in self.group.keys():
             # check if there are any infected Regions
             if self.group[name].is_infected(self.group[name].next_state):
                 self.end = False
                 self.counter[name] += 1
 
+            if self.group[name].next_state != self.group[name].state:
+                self.changed.add(name)
+                if self.zobrist is not None:
+                    self.zobrist.transition(self.group[name].numeric_id, self.group[name].state,
+                                            self.group[name].next_state)
+                if self.group[name].is_infected(self.group[name].next_state):
+                    infected.append(self.group[name].numeric_id)
+                else:
+                    immune.append(self.group[name].numeric_id)
+
             # apply next state to all elements
             self.group[name].update()
 
+        self.changes = {'infected': np.array(infected, dtype=np.int64), 'immune': np.array(immune, dtype=np.int64)}
         self.iter += 1
-        return
+        return self.changes if return_changes else None
@@ -0,0 +1,148 @@
+import numpy as np
+
+
+class FireFront(object):
+    """
+    Fire front metrics for a lattice forest, maintained incrementally as elements change state.
+    Metrics are based on the 4-neighbor lattice adjacency:
+        perimeter - number of adjacent (on fire, healthy) pairs of elements
+        front_size - number of elements on fire with at least one healthy neighbor
+        fire_size - number of elements on fire
+        spread_rate - number of elements that caught on fire in the last time step
+        bounding_box() - smallest box containing all elements on fire
+    """
+    def __init__(self, state, healthy=0, on_fire=1):
+        """
+        Initializes the metrics for a lattice where every element is healthy.
+
+        :param state: 2D numpy array of element states, shared with the simulator.
+                      The simulator must call 'transition' after every change to this array
+        :param healthy: state value of a healthy element
+        :param on_fire: state value of an element on fire
+        """
+        self.state = state
+        self.dims = state.shape
+        self.healthy = healthy
+        self.on_fire = on_fire
+
+        # number of healthy neighbors of each element
+        rows = np.arange(self.dims[0])
+        cols = np.arange(self.dims[1])
+        self.healthy_neighbors = (((rows > 0).astype(np.int8) + (rows < self.dims[0]-1))[:, None] +
+                                  ((cols > 0).astype(np.int8) + (cols < self.dims[1]-1))[None, :])
+
+        self.perimeter = 0
+        self.front_size = 0
+        self.fire_size = 0
+        self.spread_rate = 0
+        self.ignitions = 0
+
+        # number of elements on fire in each row and column, and bounds that contain the fire,
+        # which are tightened when the bounding box is requested
+        self.rows_on_fire = np.zeros(self.dims[0], dtype=np.int64)
+        self.cols_on_fire = np.zeros(self.dims[1], dtype=np.int64)
+        self.bounds = [self.dims[0], -1, self.dims[1], -1]
+        return
+
+    def neighbors(self, position):
+        """
+        Helper method to list the 4-neighbors of a position on the lattice.
+        """
+        r, c = position
+        return [(rn, cn) for (rn, cn) in [(r+1, c), (r-1, c), (r, c+1), (r, c-1)]
+                if 0 <= rn < self.dims[0] and 0 <= cn < self.dims[1]]
+
+    def transition(self, position, state, next_state):
+        """
+        Update the metrics for an element that changed state. The shared state array must already contain
+        next_state at the position.
+
+        :param position: (row, col) position of the element
+        :param state: previous state of the element
+        :param next_state: new state of the element
+        """
+        if state == next_state:
+            return
+
+        r, c = position
+        if state == self.healthy:
+            for n in self.neighbors(position):
+                self.healthy_neighbors[n] -= 1
+                if self.state[n] == self.on_fire:
+                    self.perimeter -= 1
+                    if self.healthy_neighbors[n] == 0:
+                        self.front_size -= 1
+
+        elif state == self.on_fire:
+            self.perimeter -= int(self.healthy_neighbors[r, c])
+            if self.healthy_neighbors[r, c] > 0:
+                self.front_size -= 1
+            self.fire_size -= 1
+            self.rows_on_fire[r] -= 1
+            self.cols_on_fire[c] -= 1
+
+        if next_state == self.healthy:
+            for n in self.neighbors(position):
+                self.healthy_neighbors[n] += 1
+                if self.state[n] == self.on_fire:
+                    self.perimeter += 1
+                    if self.healthy_neighbors[n] == 1:
+                        self.front_size += 1
+
+        elif next_state == self.on_fire:
+            self.perimeter += int(self.healthy_neighbors[r, c])
+            if self.healthy_neighbors[r, c] > 0:
+                self.front_size += 1
+            self.fire_size += 1
+            self.ignitions += 1
+            self.rows_on_fire[r] += 1
+            self.cols_on_fire[c] += 1
+            self.bounds = [min(self.bounds[0], r), max(self.bounds[1], r),
+                           min(self.bounds[2], c), max(self.bounds[3], c)]
+        return
+
+    def step(self):
+        """
+        Mark the end of a time step, which sets the spread rate.
+        """
+        self.spread_rate = self.ignitions
+        self.ignitions = 0
+        return
+
+    def bounding_box(self):
+        """
+        Smallest box containing all elements on fire.
+
+        :return: tuple (min row, max row, min col, max col), inclusive, or None if no element is on fire
+        """
+        if self.fire_size == 0:
+            return None
+
+        r_min, r_max, c_min, c_max = self.bounds
+        while self.rows_on_fire[r_min] == 0:
+            r_min += 1
+        while self.rows_on_fire[r_max] == 0:
+            r_max -= 1
+        while self.cols_on_fire[c_min] == 0:
+            c_min += 1
+        while self.cols_on_fire[c_max] == 0:
+            c_max -= 1
+
+        self.bounds = [r_min, r_max, c_min, c_max]
+        return tuple(self.bounds)
+
+    def snapshot(self):
+        """
+        Create a copy of the metrics that are not determined by the lattice state.
+        """
+        return {'spread_rate': self.spread_rate, 'ignitions': self.ignitions, 'bounds': list(self.bounds)}
+
+    def restore(self, snapshot):
+        """
+        Set the metrics that are not determined by the lattice state from a snapshot created by 'snapshot'.
+        The lattice must be restored first using 'transition'.
+        """
+        self.spread_rate = snapshot['spread_rate']
+        self.ignitions = snapshot['ignitions']
+        self.bounds = list(snapshot['bounds'])
+        return
@@ -52,18 +52,19 @@ class Tree(Element):
         self.state = self.next_state
         return
 
-    def next(self, forest, control=(0, 0), random_state=None):
+    def next(self, forest, control=(0, 0), random_state=None, number_neighbors_on_fire=None):
         """
         Sample, but don't apply, the next state.
         This makes implementation of a Markov process simpler.
+        The (weighted) number of neighbors on fire can be provided by the simulator, otherwise it is determined
+        from self.neighbors.
         """
         # first assume the state will not change
         self.next_state = self.state
 
         if self.state != self.burnt:
             # Only the healthy state needs to know information from the neighbors
-            number_neighbors_on_fire = None
-            if self.state == self.healthy:
+            if self.state == self.healthy and number_neighbors_on_fire is None:
                 self.neighbors_states = self.query_neighbors(forest)
                 number_neighbors_on_fire = self.neighbors_states.count(True)
 
@@ -174,6 +175,7 @@ class Tree(Element):
 
     def set_on_fire(self):
         self.state = self.on_fire
+        self.next_state = self.state
 
 
 class SimpleUrban(Element):
@@ -227,18 +229,19 @@ class SimpleUrban(Element):
         self.state = self.next_state
         return
 
-    def next(self, forest, control=(0, 0), random_state=None):
+    def next(self, forest, control=(0, 0), random_state=None, number_neighbors_on_fire=None):
         """
         Sample, but don't apply, the next state.
         This makes implementation of a Markov process simpler.
+        The (weighted) number of neighbors on fire can be provided by the simulator, otherwise it is determined
+        from self.neighbors.
         """
         # first assume the state will not change
         self.next_state = self.state
 
         if self.state != self.burnt and self.state != self.removed:
             # Only the healthy state needs to know information from the neighbors
-            number_neighbors_on_fire = None
-            if self.state == self.healthy:
+            if self.state == self.healthy and number_neighbors_on_fire is None:
                 self.neighbors_states = self.query_neighbors(forest)
                 number_neighbors_on_fire = self.neighbors_states.count(True)
 
@@ -323,3 +326,4 @@ class SimpleUrban(Element):
 
     def set_on_fire(self):
         self.state = self.on_fire
+        self.next_state = self.state
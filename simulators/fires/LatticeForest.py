@@ -1,52 +1,289 @@
+import heapq
 import itertools
 from collections import defaultdict
 import numpy as np
+import os
 
+from simulators.fires.FireFront import FireFront
 from simulators.fires.ForestElements import Tree
+from simulators.fires.Stencil import neighbor_counts, stencil_kernel, stencil_offsets
+from simulators.Packing import as_state_array, pack_state
+from simulators.RandomStreams import make_random_state, step_random_state
 from simulators.Simulator import Simulator
+from simulators.Zobrist import ZobristHash
 
 
-class LatticeForest(Simulator):
+def extract_patches(lattice, positions, size, pad_value=-1):
+    """
+    Extract a window of a 2D lattice around each position, padding positions outside the lattice.
+
+    :param lattice: 2D numpy array
+    :param positions: array-like of shape (number of positions, 2), with (row, col) coordinates for each window center
+    :param size: size of each window, integer or (height, width). For an even size, the window center is
+                 the element below and to the right of the geometric center
+    :param pad_value: value for window positions outside the lattice
+    :return: 3D numpy array of shape (number of positions, height, width), with dtype int8
+    """
+    height, width = (size, size) if isinstance(size, int) else size
+    positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+
+    rows = positions[:, 0, None] + np.arange(height) - height//2
+    cols = positions[:, 1, None] + np.arange(width) - width//2
+    valid_rows = (0 <= rows) & (rows < lattice.shape[0])
+    valid_cols = (0 <= cols) & (cols < lattice.shape[1])
+
+    # gather with clipped indices, then overwrite positions outside the lattice
+    patches = lattice[np.clip(rows, 0, lattice.shape[0]-1)[:, :, None],
+                      np.clip(cols, 0, lattice.shape[1]-1)[:, None, :]].astype(np.int8)
+    patches[~(valid_rows[:, :, None] & valid_cols[:, None, :])] = pad_value
+
+    return patches
+
+
+def flat_indices(positions, dims):
+    """
+    Convert (row, col) positions into indices of the flattened lattice, row*width + col.
+
+    :param positions: collection of (row, col) positions
+    :param dims: (height, width) of the lattice
+    :return: 1D int64 numpy array
+    """
+    positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+    return positions[:, 0]*dims[1] + positions[:, 1]
+
+
+def parameter_field(parameter, iteration=0):
+    """
+    Evaluate a simulator parameter, which is a dictionary with (row, col) as keys, a 2D numpy array, the path of a
+    2D numpy array saved as a .npy file, or a function that takes the time step and returns a 2D numpy array.
+    A .npy file is memory-mapped, so only the parts of the file that are used are read from disk.
+
+    :param parameter: dictionary, 2D numpy array, path, or function
+    :param iteration: time step used to evaluate a function
+    :return: tuple (value, schedule), where value is a dictionary or 2D numpy array, and schedule is the function
+             or None if the parameter is not time-varying
+    """
+    if isinstance(parameter, (str, os.PathLike)):
+        return np.load(parameter, mmap_mode='r'), None
+    if callable(parameter):
+        return np.asarray(parameter(iteration)), parameter
+    if isinstance(parameter, dict):
+        return parameter, None
+    return np.asarray(parameter), None
+
+
+def element_parameter(field, position):
+    """
+    Read the parameter of an element when it is created. Memory-mapped parameters are not read, since they are
+    copied to an element each time it is sampled, so that creating a simulator does not read the whole file.
+
+    :param field: parameter value returned by parameter_field
+    :param position: (row, col) position of the element
+    """
+    return None if isinstance(field, np.memmap) else field[position]
+
+
+class LatticeMixin(object):
+    """
+    Methods shared by the lattice-based forests, LatticeForest and UrbanForest. A subclass defines num_states and the
+    attributes dims, state, front, zobrist, group, alpha, beta, neighborhood, neighbor_offsets, rng and random_state,
+    as well as the _restore method.
+    """
+    num_states = 3
+
+    def reset(self):
+        """
+        Reset the simulation object to its initial configuration.
+        Only the elements whose state changed since initialization are modified.
+        """
+        self._restore(self.initial_snapshot, self.changed)
+        self.changed = set()
+
+        # without a seed, each episode draws fresh randomness instead of repeating the first episode
+        if self.rng is None:
+            self.random_state = make_random_state(self.rng)
+        return
+
+    def set_parameters(self, alpha=None, beta=None):
+        """
+        Change the fire propagation and/or persistence parameters. Arrays and functions are used directly,
+        dictionaries are copied to each element.
+
+        :param alpha: fire propagation parameter, in the same formats as the constructor
+        :param beta: fire persistence parameter, in the same formats as the constructor
+        """
+        if alpha is not None:
+            self.alpha, self.alpha_schedule = parameter_field(alpha, self.iter)
+            if isinstance(self.alpha, dict):
+                for p, element in self.group.items():
+                    element.alpha = self.alpha[p]
+
+        if beta is not None:
+            self.beta, self.beta_schedule = parameter_field(beta, self.iter)
+            if isinstance(self.beta, dict):
+                for p, element in self.group.items():
+                    element.beta = self.beta[p]
+
+        return
+
+    def dense_state(self):
+        """
+        Creates a representation of the state of each element.
+
+        :return: 2D numpy array where each position (row, col) corresponds to an element state
+        """
+        return self.state.astype(np.int64)
+
+    def observe_patches(self, positions, size, pad_value=-1):
+        """
+        Creates a local observation of the state of each element around a collection of positions,
+        for example to serve observations to a team of agents. Only the observed elements are accessed.
+
+        :param positions: array-like of shape (number of positions, 2), with (row, col) coordinates for each window center
+        :param size: size of each window, integer or (height, width)
+        :param pad_value: value for window positions outside the forest
+        :return: 3D numpy array of shape (number of positions, height, width), with dtype int8
+        """
+        return extract_patches(self.state, positions, size, pad_value=pad_value)
+
+    def _set_state(self, position, state):
+        """
+        Helper method to record the state of an element in the state array and update the fire front metrics.
+        """
+        previous_state = self.state[position]
+        self.state[position] = state
+        self.front.transition(position, previous_state, state)
+        if self.zobrist is not None:
+            self.zobrist.transition(position, previous_state, state)
+        return
+
+    def state_hash(self):
+        """
+        Hash of the state of every element, which does not depend on the time step. The hash is computed on the first
+        call and maintained incrementally afterwards, since its table of random values uses 8 bytes per element and
+        state.
+
+        :return: 64-bit integer, see ZobristHash
+        """
+        if self.zobrist is None:
+            self.zobrist = ZobristHash(self.dims, self.num_states, state=self.state)
+        return int(self.zobrist.value)
+
+    def _neighborhood(self, position, direction):
+        """
+        Helper method to list the positions at the neighborhood kernel offsets from a position, inside the lattice.
+
+        :param position: (row, col) position
+        :param direction: 1 for the neighbors of the position, or -1 for the positions that have it as a neighbor
+        """
+        r, c = position
+        return [(r+direction*dr, c+direction*dc) for dr, dc, _ in self.neighbor_offsets
+                if 0 <= r+direction*dr < self.dims[0] and 0 <= c+direction*dc < self.dims[1]]
+
+    def _neighbor_counts(self):
+        """
+        Helper method to calculate the weighted number of neighbors on fire with the neighborhood kernel,
+        for every element within the kernel radius of the bounding box of the fire.
+
+        :return: None if there is no neighborhood kernel or no fire, otherwise a tuple (counts, row, col) where
+                 counts is a 2D numpy array whose first entry corresponds to position (row, col)
+        """
+        bounding_box = self.front.bounding_box()
+        if self.neighborhood is None or bounding_box is None:
+            return None
+
+        r_min, r_max, c_min, c_max = bounding_box
+        r_radius, c_radius = self.neighborhood.shape[0]//2, self.neighborhood.shape[1]//2
+        r_min, r_max = max(r_min-r_radius, 0), min(r_max+r_radius+1, self.dims[0])
+        c_min, c_max = max(c_min-c_radius, 0), min(c_max+c_radius+1, self.dims[1])
+
+        # all elements on fire are inside the window, so the counts inside the window are exact
+        on_fire = self.state[r_min:r_max, c_min:c_max] == self.front.on_fire
+        return neighbor_counts(on_fire, self.neighborhood), r_min, c_min
+
+    def _sync_parameters(self, position):
+        """
+        Helper method to copy array-valued parameters to an element before sampling its next state.
+        """
+        if isinstance(self.alpha, np.ndarray):
+            self.group[position].alpha = float(self.alpha[position])
+        if isinstance(self.beta, np.ndarray):
+            self.group[position].beta = float(self.beta[position])
+        return
+
+
+class LatticeForest(LatticeMixin, Simulator):
     """
     A simulator for a forest fire using a discrete probabilistic lattice model.
     """
     def __init__(self, dimension, rng=None, initial_fire=None,
-                 alpha=None, beta=None, tree_model='exponential'):
+                 alpha=None, beta=None, tree_model='exponential', event_driven=False, neighborhood=None):
         """
         Initializes a simulation object. Each element is a Tree with a (row, col) position.
 
         :param dimension: size of forest, integer or (height, width)
                           if an integer, the forest is square
-        :param rng: random number generator seed for deterministic sampling
+        :param rng: random number generator seed for deterministic sampling, or a RandomStreams object to sample
+                    each time step from its own stream
         :param initial_fire: collection of (row, col) coordinates describing positions of initial fires
-        :param alpha: fire propagation parameter, as a dictionary with (row, col) as keys
-        :param beta: fire persistence parameter, as a dictionary with (row, col) as keys)
+        :param alpha: fire propagation parameter, as a dictionary with (row, col) as keys, a 2D numpy array,
+                      the path of a .npy file with a 2D array, which is memory-mapped and read lazily,
+                      or a function that takes the time step and returns a 2D numpy array
+        :param beta: fire persistence parameter, in the same formats as alpha
         :param tree_model: simulation model for Tree elements, either 'linear' or 'exponential'
+        :param neighborhood: neighbors of each element, None for the 4 adjacent elements on the lattice, or a
+                             description accepted by stencil_kernel, such as 'moore' or a weighted kernel.
+                             With a kernel, the weighted number of neighbors on fire is calculated for all
+                             elements near the fire in one pass
+        :param event_driven: if True, the time at which a Tree burns out is sampled once when it catches on fire
+                             and kept in a priority queue, instead of sampling each time step.
+                             The sampled trajectories differ but have the same distribution
         """
         Simulator.__init__(self)
 
         self.dims = (dimension, dimension) if isinstance(dimension, int) else dimension
         if tree_model == 'exponential':
-            self.alpha = defaultdict(lambda: 0.2763) if alpha is None else alpha
+            alpha = defaultdict(lambda: 0.2763) if alpha is None else alpha
         elif tree_model == 'linear':
-            self.alpha = defaultdict(lambda: 0.2) if alpha is None else alpha
-        self.beta = defaultdict(lambda: np.exp(-1/10)) if beta is None else beta
+            alpha = defaultdict(lambda: 0.2) if alpha is None else alpha
+        beta = defaultdict(lambda: np.exp(-1/10)) if beta is None else beta
+
+        # array-valued parameters are read directly when a Tree is sampled,
+        # so that they can be changed without modifying each Tree
+        self.alpha, self.alpha_schedule = parameter_field(alpha)
+        self.beta, self.beta_schedule = parameter_field(beta)
 
         # statistics for the simulation: number of [healthy, fire, burnt] trees
         self.stats = np.zeros(3).astype(np.uint32)
         self.stats[0] += self.dims[0]*self.dims[1]
 
+        # state of each Tree, kept consistent with the Tree elements
+        self.state = np.zeros(self.dims, dtype=np.uint8)
+        # fire front metrics, maintained as Trees change state
+        self.front = FireFront(self.state)
+        # hash of the state array, created by state_hash
+        self.zobrist = None
+
         # deterministic sampling
         self.rng = rng
-        self.random_state = np.random.RandomState(self.rng)
+        self.random_state = make_random_state(self.rng)
+
+        # neighborhood kernel and the corresponding (delta row, delta col, weight) offsets
+        self.neighborhood = None if neighborhood is None else stencil_kernel(neighborhood)
+        self.neighbor_offsets = None if neighborhood is None else stencil_offsets(self.neighborhood)
 
         # the forest is a group of Trees
         self.group = dict()
         for r in range(self.dims[0]):
             for c in range(self.dims[1]):
-                self.group[(r, c)] = Tree(self.alpha[(r, c)], self.beta[(r, c)], position=np.array([r, c]),
+                self.group[(r, c)] = Tree(element_parameter(self.alpha, (r, c)),
+                                          element_parameter(self.beta, (r, c)), position=np.array([r, c]),
                                           numeric_id=r*self.dims[1]+c, model=tree_model)
 
+                if self.neighborhood is not None:
+                    self.group[(r, c)].neighbors = self._neighborhood((r, c), 1)
+                    continue
+
                 # neighbors are adjacent Trees on the lattice
                 if 0 <= r+1 < self.dims[0]:
                     self.group[(r, c)].neighbors.append((r+1, c))
@@ -62,9 +299,25 @@ class LatticeForest(Simulator):
         self.fires = []  # list containing (row, col) positions corresponding to Trees on fire
         self.initial_fire = initial_fire
         self._start_fire()
+        # initial fires do not count towards the rate of spread
+        self.front.ignitions = 0
+
+        # priority queue of (time step, (row, col)) describing when Trees on fire burn out, and the
+        # currently scheduled time step for each Tree on fire. Queue entries that disagree are stale
+        self.event_driven = event_driven
+        self.burnout_queue = []
+        self.burnout_time = dict()
+        self._schedule_burnouts(self.fires, 0)
 
         self.end = False
         self.early_end = False
+
+        # flattened (row*width + col) indices of the Trees that changed state in the last time step
+        self.changes = {'ignited': flat_indices([], self.dims), 'burnt': flat_indices([], self.dims)}
+
+        # the initial configuration, and the positions of Trees whose state differs from it
+        self.initial_snapshot = self.snapshot()
+        self.changed = set()
         return
 
     def _start_fire(self):
@@ -76,6 +329,7 @@ class LatticeForest(Simulator):
             self.fires = self.initial_fire
             for p in self.initial_fire:
                 self.group[p].set_on_fire()
+                self._set_state(p, self.group[p].state)
 
             self.stats[0] -= len(self.initial_fire)
             self.stats[1] += len(self.initial_fire)
@@ -84,8 +338,8 @@ class LatticeForest(Simulator):
 
         # start a 4x4 square of fires at center
         # if forest size is too small, start a single fire at the center
-        r_center = np.floor((self.dims[0]-1)/2).astype(np.uint8)
-        c_center = np.floor((self.dims[1]-1)/2).astype(np.uint8)
+        r_center = (self.dims[0]-1)//2
+        c_center = (self.dims[1]-1)//2
 
         delta_r = [0] if self.dims[0]<4 else [k for k in range(-1, 3)]
         delta_c = [0] if self.dims[1]<4 else [k for k in range(-1, 3)]
@@ -95,6 +349,7 @@ class LatticeForest(Simulator):
             r, c = r_center+dr, c_center+dc
             self.fires.append((r, c))
             self.group[(r, c)].set_on_fire()
+            self._set_state((r, c), self.group[(r, c)].state)
 
         self.stats[0] -= len(self.fires)
         self.stats[1] += len(self.fires)
@@ -103,48 +358,180 @@ class LatticeForest(Simulator):
     def reset(self):
         """
         Reset the simulation object to its initial configuration.
+        Only the Trees whose state changed since initialization are modified.
         """
-        # reset statistics
-        self.stats = np.zeros(3).astype(np.uint32)
-        self.stats[0] += self.dims[0]*self.dims[1]
+        LatticeMixin.reset(self)
 
-        # reset elements
-        for element in self.group.values():
-            element.reset()
+        # the burnout times of the initial fires are sampled again from the new random number generator
+        if self.rng is None and self.event_driven:
+            self.burnout_queue = []
+            self.burnout_time = dict()
+            self._schedule_burnouts(self.fires, 0)
+        return
 
-        # reset to initial condition
-        self.iter = 0
-        self.fires = []
-        self._start_fire()
-        self.random_state = np.random.RandomState(self.rng)
+    def snapshot(self, packed=False):
+        """
+        Create a copy of the simulation state, including the random number generator state.
 
-        self.end = False
-        self.early_end = False
+        :param packed: if True, the state of each element is packed into 2 bits, see pack_state
+        :return: dictionary describing the simulation state, which can be applied with 'restore'
+        """
+        return {'state': pack_state(self.state) if packed else self.state.copy(),
+                'fires': list(self.fires), 'stats': self.stats.copy(),
+                'iter': self.iter, 'end': self.end, 'early_end': self.early_end,
+                'random_state': self.random_state.get_state(legacy=False),
+                'burnout_queue': list(self.burnout_queue), 'burnout_time': dict(self.burnout_time),
+                'front': self.front.snapshot(),
+                'hash': None if self.zobrist is None else int(self.zobrist)}
+
+    def restore(self, snapshot):
+        """
+        Set the simulation state from a snapshot created by 'snapshot', with a packed or unpacked state.
+        Only the Trees whose state differs from the snapshot are modified.
+        """
+        snapshot = dict(snapshot, state=as_state_array(snapshot['state']))
+        positions = [tuple(p) for p in np.argwhere(self.state != snapshot['state']).tolist()]
+        self._restore(snapshot, positions)
+        self.changed = set(tuple(p) for p in np.argwhere(self.state != self.initial_snapshot['state']).tolist())
         return
 
-    def dense_state(self):
+    def _restore(self, snapshot, positions):
+        """
+        Helper method to set the simulation state from a snapshot.
+
+        :param snapshot: dictionary created by 'snapshot'
+        :param positions: collection of (row, col) positions of Trees whose state may differ from the snapshot
         """
-        Creates a representation of the state of each Tree.
+        for p in positions:
+            self._set_state(p, int(snapshot['state'][p]))
+            self.group[p].state = int(self.state[p])
+            self.group[p].next_state = self.group[p].state
+        self.front.restore(snapshot['front'])
+
+        self.fires = list(snapshot['fires'])
+        self.stats = snapshot['stats'].copy()
+        self.iter = snapshot['iter']
+        self.changes = {'ignited': flat_indices([], self.dims), 'burnt': flat_indices([], self.dims)}
+        self.end = snapshot['end']
+        self.early_end = snapshot['early_end']
+        self.random_state.set_state(snapshot['random_state'])
+
+        self.burnout_queue = list(snapshot['burnout_queue'])
+        self.burnout_time = dict(snapshot['burnout_time'])
+        return
 
-        :return: 2D numpy array where each position (row, col) corresponds to a Tree state
+    def set_parameters(self, alpha=None, beta=None):
         """
-        return np.array([[self.group[(r, c)].state for c in range(self.dims[1])]
-                         for r in range(self.dims[0])])
+        Change the fire propagation and/or persistence parameters, see LatticeMixin.set_parameters.
+        """
+        LatticeMixin.set_parameters(self, alpha=alpha, beta=beta)
+
+        # sampled burnout times depend on beta, so sample them again for all Trees on fire
+        if beta is not None:
+            self._schedule_burnouts(self.fires, self.iter)
+        return
 
-    def update(self, control=None):
+    def _schedule_burnouts(self, positions, start):
         """
-        Update the simulator one time step.
+        Helper method to sample when Trees on fire burn out, if the simulator is event driven.
+        Without control, a Tree on fire burns out with probability 1-beta each time step, so the number of
+        time steps it remains on fire, including the time step it burns out, is geometrically distributed.
+
+        :param positions: collection of (row, col) positions of Trees on fire
+        :param start: first time step at which the Trees can burn out
+        """
+        if not self.event_driven:
+            return
+
+        for p in positions:
+            self._sync_parameters(p)
+            p_burnout = 1 - self.group[p].beta
+            if p_burnout <= 0:
+                # the Tree will never burn out without control
+                self.burnout_time.pop(p, None)
+                continue
+
+            self.burnout_time[p] = start + self.random_state.geometric(min(p_burnout, 1)) - 1
+            heapq.heappush(self.burnout_queue, (self.burnout_time[p], p))
+
+        # remove stale entries once they outnumber the scheduled burnouts
+        if len(self.burnout_queue) > 2*len(self.burnout_time):
+            self.burnout_queue = [(t, p) for p, t in self.burnout_time.items()]
+            heapq.heapify(self.burnout_queue)
+
+        return
+
+    def _due_burnouts(self, control):
+        """
+        Helper method to determine which Trees on fire burn out this time step, if the simulator is event driven.
+        Trees with a delta_beta control are sampled this time step as usual and, if they remain on fire,
+        their burnout time is sampled again from the next time step.
+
+        :return: list of (row, col) positions corresponding to Trees that burn out this time step
+        """
+        burnt = []
+
+        # Trees on fire with a non-zero delta_beta control
+        default_factory = getattr(control, 'default_factory', None)
+        if default_factory is not None and default_factory()[1] != 0:
+            controlled = self.fires
+        else:
+            controlled = [p for p, u in control.items() if u[1] != 0 and self.group[p].is_on_fire(self.group[p].state)]
+
+        for p in controlled:
+            self._sync_parameters(p)
+            self.group[p].next(self.group, control[p], self.random_state)
+            if self.group[p].is_burnt(self.group[p].next_state):
+                burnt.append(p)
+                self.burnout_time.pop(p, None)
+            else:
+                self._schedule_burnouts([p], self.iter+1)
+
+        # scheduled burnouts
+        while self.burnout_queue and self.burnout_queue[0][0] <= self.iter:
+            t, p = heapq.heappop(self.burnout_queue)
+            if self.burnout_time.get(p) != t:
+                continue
+
+            del self.burnout_time[p]
+            self.group[p].next_state = self.group[p].burnt
+            burnt.append(p)
+
+        return burnt
+
+    def update(self, control=None, return_changes=False):
+        """
+        Update the simulator one time step. The Trees that changed state are stored in self.changes.
 
         :param control: collection to map (row, col) to control for each Tree,
                         which is a tuple of (delta_alpha, delta_beta)
+        :param return_changes: if True, return self.changes
+        :return: None, or a dictionary with the flattened (row*width + col) indices of the Trees that caught on fire
+                 ('ignited') and burnt out ('burnt') this time step
         """
         if self.end:
             print("fire extinguished")
-            return
+            self.changes = {'ignited': flat_indices([], self.dims), 'burnt': flat_indices([], self.dims)}
+            return self.changes if return_changes else None
 
         if control is None:
             control = defaultdict(lambda: (0, 0))
 
+        self.random_state = step_random_state(self.rng, self.iter, self.random_state)
+
+        # evaluate time-varying parameters
+        if self.alpha_schedule is not None:
+            self.alpha = np.asarray(self.alpha_schedule(self.iter))
+        if self.beta_schedule is not None:
+            beta = np.asarray(self.beta_schedule(self.iter))
+            # only the Trees on fire whose beta changed need a new burnout time
+            if isinstance(self.beta, np.ndarray) and self.beta.shape == beta.shape:
+                changed = [p for p in self.fires if self.beta[p] != beta[p]] if self.event_driven else []
+            else:
+                changed = self.fires
+            self.beta = beta
+            self._schedule_burnouts(changed, self.iter)
+
         # assume that the fire cannot spread further this step,
         # which occurs when no healthy Trees have a neighbor that is on fire
         self.early_end = True
@@ -154,33 +541,59 @@ class LatticeForest(Simulator):
         # list of (row, col) positions corresponding to healthy Trees that have been sampled to determine
         # if they will catch on fire
         checked = []
+        checked_set = set()
+        # list of (row, col) positions corresponding to Trees that burn out this time step
+        burnt = []
+
+        if self.event_driven:
+            burnt = self._due_burnouts(control)
+            self.stats[1] -= len(burnt)
+            self.stats[2] += len(burnt)
 
         # fire spreading check:
         #   iterate over current fires, find their neighbors that are healthy, and sample
         #   to determine if the healthy Tree catches on fire
         # all other Tree states will not change
+        counts = self._neighbor_counts()
+
         for f in self.fires:
-            for fn in self.group[f].neighbors:
-                if fn not in checked and self.group[fn].is_healthy(self.group[fn].state):
+            # Trees whose number of neighbors on fire depends on the current Tree on fire
+            spread = self.group[f].neighbors if self.neighborhood is None else self._neighborhood(f, -1)
+            for fn in spread:
+                if fn not in checked_set and self.group[fn].is_healthy(self.group[fn].state):
 
                     self.early_end = False
 
                     # calculate next state
-                    self.group[fn].next(self.group, control[fn], self.random_state)
+                    self._sync_parameters(fn)
+                    if counts is None:
+                        self.group[fn].next(self.group, control[fn], self.random_state)
+                    else:
+                        self.group[fn].next(self.group, control[fn], self.random_state,
+                                            counts[0][fn[0]-counts[1], fn[1]-counts[2]])
                     if self.group[fn].is_on_fire(self.group[fn].next_state):
                         add.append(fn)
 
                     checked.append(fn)
+                    checked_set.add(fn)
+
+            if self.event_driven:
+                continue
 
             # determine if the current Tree on fire will extinguish this time step
+            self._sync_parameters(f)
             self.group[f].next(self.group, control[f], self.random_state)
             if self.group[f].is_burnt(self.group[f].next_state):
+                burnt.append(f)
                 self.stats[1] -= 1
                 self.stats[2] += 1
 
-        # apply next state to all elements
-        for element in self.group.values():
-            element.update()
+        # apply next state to all elements that were sampled, the state of all other elements does not change
+        for p in itertools.chain(checked, self.fires):
+            self.group[p].update()
+
+        for p in itertools.chain(burnt, add):
+            self._set_state(p, self.group[p].state)
 
         # retain Trees that are still on fire
         self.fires = [f for f in self.fires
@@ -191,11 +604,16 @@ class LatticeForest(Simulator):
         self.stats[0] -= len(add)
         self.stats[1] += len(add)
 
+        self.changed.update(burnt)
+        self.changed.update(add)
+        self.changes = {'ignited': flat_indices(add, self.dims), 'burnt': flat_indices(burnt, self.dims)}
+        self.front.step()
+
         self.iter += 1
+        self._schedule_burnouts(add, self.iter)
 
         if not self.fires:
             self.early_end = True
             self.end = True
-            return
 
-        return
+        return self.changes if return_changes else None
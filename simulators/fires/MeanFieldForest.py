@@ -0,0 +1,268 @@
+import numpy as np
+import os
+
+from simulators.fires.LatticeForest import LatticeForest
+from simulators.fires.Percolation import parameter_arrays
+from simulators.Simulator import Simulator
+
+
+def _block_sum(array, block_size, shape):
+    """
+    Helper function to sum a 2D array over square blocks, padding the last blocks with zeros.
+
+    :param shape: (rows, cols) number of blocks
+    """
+    padded = np.zeros((shape[0]*block_size, shape[1]*block_size))
+    padded[:array.shape[0], :array.shape[1]] = array
+    return padded.reshape(shape[0], block_size, shape[1], block_size).sum(axis=(1, 3))
+
+
+class MeanFieldForest(Simulator):
+    """
+    A coarse-grained, deterministic approximation of a LatticeForest for very large forests.
+
+    The lattice is divided into square blocks of block_size x block_size Trees, and each block holds the expected
+    fraction of its Trees that are healthy, on fire and burnt. Each time step, a healthy Tree in a block is assumed
+    to have each of its 4 neighbors on fire independently, with the on fire fraction of the block that contains the
+    neighbor: a neighbor is in the same block with probability (block_size-1)/block_size, and otherwise in the
+    adjacent block in that direction. The Tree dynamics then give the expected fraction of Trees that catch on fire,
+    which for the exponential model is
+
+        1 - product over the 4 directions of (1 - (alpha - delta_alpha)*p_direction)
+
+    and for the linear model is (alpha - delta_alpha) times the expected number of neighbors on fire. Trees on
+    fire burn out with probability 1 - beta + delta_beta, as in the exact model.
+
+    Each time step costs a few array operations per block instead of a random sample per Tree, so the cost is
+    reduced by a factor of about block_size**2. Blocks near the fire front can be refined into a LatticeForest with
+    'refine' when more detail is needed. Since the model is deterministic, it cannot represent a fire that dies out
+    early by chance, and it overestimates the extent of subcritical and near-critical fires. See the fires README
+    for a comparison with the exact simulator.
+    """
+    def __init__(self, dimension, block_size, initial_fire=None, alpha=None, beta=None, tree_model='exponential',
+                 extinction_threshold=0.5):
+        """
+        Initializes a mean-field simulation object.
+
+        :param dimension: size of forest, integer or (height, width)
+        :param block_size: number of Trees along each side of a block
+        :param initial_fire: collection of (row, col) coordinates describing positions of initial fires,
+                             defaults to the same fire as LatticeForest
+        :param alpha: fire propagation parameter, a scalar, a 2D numpy array, the path of a .npy file with a 2D array,
+                      or a dictionary with (row, col) as keys. Each block uses the average parameter of its Trees
+        :param beta: fire persistence parameter, in the same formats as alpha
+        :param tree_model: Tree model to approximate, either 'linear' or 'exponential'
+        :param extinction_threshold: the fire is extinguished when the expected number of Trees on fire is less
+                                     than this value
+        """
+        Simulator.__init__(self)
+
+        self.dims = (dimension, dimension) if isinstance(dimension, int) else tuple(dimension)
+        self.block_size = block_size
+        self.blocks = (-(-self.dims[0]//block_size), -(-self.dims[1]//block_size))
+        self.model = tree_model
+        self.extinction_threshold = extinction_threshold
+
+        if alpha is None:
+            alpha = 0.2763 if tree_model == 'exponential' else 0.2
+        beta = np.exp(-1/10) if beta is None else beta
+
+        # number of Trees in each block, which is smaller for blocks on the bottom and right edges
+        self.size = np.outer(np.minimum(block_size, self.dims[0] - block_size*np.arange(self.blocks[0])),
+                             np.minimum(block_size, self.dims[1] - block_size*np.arange(self.blocks[1])))
+        self.alpha = self._block_parameter(alpha)
+        self.beta = self._block_parameter(beta)
+
+        if initial_fire is None:
+            # the 4x4 square of fires at the center used by LatticeForest
+            r_center, c_center = (self.dims[0]-1)//2, (self.dims[1]-1)//2
+            delta_r = [0] if self.dims[0] < 4 else range(-1, 3)
+            delta_c = [0] if self.dims[1] < 4 else range(-1, 3)
+            initial_fire = [(r_center+dr, c_center+dc) for dr in delta_r for dc in delta_c]
+        self.initial_fire = initial_fire
+
+        self.reset()
+        return
+
+    @classmethod
+    def from_forest(cls, forest, block_size, **kwargs):
+        """
+        Create a mean-field approximation of the current state and parameters of a LatticeForest.
+
+        :param forest: LatticeForest simulator, which is not modified
+        :param block_size: number of Trees along each side of a block
+        """
+        element = next(iter(forest.group.values()))
+        alpha, beta = parameter_arrays(forest)
+        simulator = cls(forest.dims, block_size, initial_fire=[], alpha=alpha, beta=beta, tree_model=element.model,
+                        **kwargs)
+
+        for k, state in enumerate([element.healthy, element.on_fire, element.burnt]):
+            simulator.fractions[k] = _block_sum(forest.state == state, block_size, simulator.blocks)/simulator.size
+        simulator.iter = forest.iter
+        simulator._check_end()
+        return simulator
+
+    def _block_parameter(self, parameter):
+        """
+        Helper method to average a Tree parameter over each block.
+        """
+        if isinstance(parameter, (str, os.PathLike)):
+            parameter = np.load(parameter, mmap_mode='r')
+        elif isinstance(parameter, dict):
+            array = np.zeros(self.dims)
+            for (r, c), value in parameter.items():
+                array[r, c] = value
+            parameter = array
+
+        if np.ndim(parameter) == 0:
+            return np.full(self.blocks, float(parameter))
+
+        # average one row of blocks at a time, so that a memory-mapped array is read in strips
+        block_sum = np.zeros(self.blocks)
+        for i in range(self.blocks[0]):
+            rows = np.asarray(parameter[i*self.block_size:(i+1)*self.block_size], dtype=float)
+            block_sum[i] = _block_sum(rows, self.block_size, (1, self.blocks[1]))[0]
+        return block_sum/self.size
+
+    def reset(self):
+        """
+        Reset the simulation object to its initial configuration.
+        """
+        # fraction of Trees in each block that are [healthy, on fire, burnt]
+        self.fractions = np.zeros((3,) + self.blocks)
+        self.fractions[0] = 1
+
+        for r, c in self.initial_fire:
+            b = (r//self.block_size, c//self.block_size)
+            self.fractions[0][b] -= 1/self.size[b]
+            self.fractions[1][b] += 1/self.size[b]
+
+        self.iter = 0
+        self.end = False
+        self._check_end()
+        return
+
+    def _check_end(self):
+        """
+        Helper method to determine if the fire is extinguished.
+        """
+        self.end = self.stats[1] < self.extinction_threshold
+        return
+
+    @property
+    def stats(self):
+        """
+        Expected number of [healthy, on fire, burnt] Trees.
+        """
+        return (self.fractions*self.size).sum(axis=(1, 2))
+
+    def dense_state(self):
+        """
+        Create a representation of the state of each block.
+
+        :return: 3D numpy array of shape (block rows, block cols, 3) with the fraction of Trees in each block that
+                 are healthy, on fire and burnt
+        """
+        return np.moveaxis(self.fractions, 0, -1).copy()
+
+    def _control_arrays(self, control):
+        """
+        Helper method to convert a control collection, mapping block (row, col) to (delta_alpha, delta_beta),
+        into two 2D arrays.
+        """
+        delta_alpha = np.zeros(self.blocks)
+        delta_beta = np.zeros(self.blocks)
+        if control is None:
+            return delta_alpha, delta_beta
+
+        default_factory = getattr(control, 'default_factory', None)
+        if default_factory is not None:
+            delta_alpha[:], delta_beta[:] = default_factory()
+        for b, (d_alpha, d_beta) in control.items():
+            delta_alpha[b], delta_beta[b] = d_alpha, d_beta
+
+        return delta_alpha, delta_beta
+
+    def update(self, control=None):
+        """
+        Update the expected fractions one time step.
+
+        :param control: collection to map block (row, col) to control for every Tree in the block,
+                        which is a tuple of (delta_alpha, delta_beta)
+        """
+        if self.end:
+            print("fire extinguished")
+            return
+
+        delta_alpha, delta_beta = self._control_arrays(control)
+        healthy, on_fire, burnt = self.fractions
+
+        # probability that the neighbor of a Tree in each direction is on fire
+        padded = np.pad(on_fire, 1)
+        inside = (self.block_size - 1)/self.block_size
+        neighbor_p = [inside*on_fire + (1 - inside)*padded[2:, 1:-1],
+                      inside*on_fire + (1 - inside)*padded[:-2, 1:-1],
+                      inside*on_fire + (1 - inside)*padded[1:-1, 2:],
+                      inside*on_fire + (1 - inside)*padded[1:-1, :-2]]
+
+        # expected probability that a healthy Tree catches on fire, and that a Tree on fire burns out
+        if self.model == 'linear':
+            p_ignite = (self.alpha - delta_alpha)*sum(neighbor_p)
+        else:
+            p_ignite = 1 - np.prod([1 - (self.alpha - delta_alpha)*p for p in neighbor_p], axis=0)
+        p_ignite = np.clip(p_ignite, 0, 1)
+        p_burnout = np.clip(1 - self.beta + delta_beta, 0, 1)
+
+        ignited = healthy*p_ignite
+        burnt_out = on_fire*p_burnout
+        self.fractions = np.stack([healthy - ignited, on_fire + ignited - burnt_out, burnt + burnt_out])
+
+        self.iter += 1
+        self._check_end()
+        return
+
+    def refine(self, threshold=0.01, margin=1, rng=None):
+        """
+        Sample a full resolution LatticeForest for the blocks near the fire front, for example to continue the
+        simulation with the exact model once the fire is close to an area of interest. The state of each Tree is
+        sampled independently from the fractions of its block, and each Tree uses the average parameters of its
+        block. Trees outside the refined window are treated as not on fire by the LatticeForest.
+
+        :param threshold: blocks whose on fire fraction is larger than this value are refined
+        :param margin: number of additional blocks refined around the refined blocks
+        :param rng: random number generator seed, used for sampling and by the LatticeForest
+        :return: None if no block is refined, otherwise a tuple (forest, (row, col)) where (row, col) is the position
+                 of the first Tree of the forest in this lattice
+        """
+        active = np.argwhere(self.fractions[1] > threshold)
+        if active.size == 0:
+            return None
+
+        b_min = np.maximum(active.min(axis=0) - margin, 0)
+        b_max = np.minimum(active.max(axis=0) + margin + 1, self.blocks)
+        r_min, c_min = b_min*self.block_size
+        r_max, c_max = np.minimum(b_max*self.block_size, self.dims)
+
+        # block fractions and parameters for each Tree of the window
+        rows = np.arange(r_min, r_max)//self.block_size
+        cols = np.arange(c_min, c_max)//self.block_size
+        cumulative = np.cumsum(self.fractions[:, rows[:, None], cols[None, :]], axis=0)
+        alpha = self.alpha[rows[:, None], cols[None, :]]
+        beta = self.beta[rows[:, None], cols[None, :]]
+
+        random_state = np.random.RandomState(rng)
+        uniform = random_state.rand(len(rows), len(cols))
+        state = (uniform >= cumulative[0]).astype(np.uint8) + (uniform >= cumulative[1])
+
+        forest = LatticeForest((len(rows), len(cols)), rng=rng, alpha=alpha, beta=beta, tree_model=self.model,
+                               initial_fire=[tuple(p) for p in np.argwhere(state == 1).tolist()])
+        snapshot = forest.snapshot()
+        snapshot['state'] = state
+        snapshot['stats'] = np.bincount(state.ravel(), minlength=3).astype(np.uint32)
+        forest.restore(snapshot)
+
+        # the refined configuration is the initial configuration of the forest
+        forest.initial_snapshot = forest.snapshot()
+        forest.changed = set()
+        return forest, (int(r_min), int(c_min))
@@ -0,0 +1,150 @@
+import numpy as np
+
+from simulators import Kernels
+from simulators.RandomStreams import RandomStreams
+
+
+# offsets (delta row, delta col, weight) from a Tree to the neighbors it can spread fire to,
+# for the default 4-neighbor lattice adjacency
+NEIGHBOR_OFFSETS = ((1, 0, 1), (-1, 0, 1), (0, 1, 1), (0, -1, 1))
+
+
+def parameter_arrays(forest):
+    """
+    Collect the fire propagation and persistence parameters of each element of a lattice forest.
+
+    :param forest: LatticeForest simulator
+    :return: tuple (alpha, beta) of 2D numpy arrays
+    """
+    arrays = []
+    for name, field in [('alpha', forest.alpha), ('beta', forest.beta)]:
+        # array-valued parameters are used directly, otherwise the parameters are collected from each element
+        if isinstance(field, np.ndarray):
+            arrays.append(np.broadcast_to(field, forest.dims))
+            continue
+
+        array = np.zeros(forest.dims)
+        for (r, c), element in forest.group.items():
+            array[r, c] = getattr(element, name)
+        arrays.append(array)
+
+    return tuple(arrays)
+
+
+def _shift(array, dr, dc):
+    """
+    Helper function to move the last two axes of an array by (dr, dc), filling with zeros.
+    """
+    shifted = np.zeros_like(array)
+    height, width = array.shape[-2:]
+    if abs(dr) >= height or abs(dc) >= width:
+        return shifted
+
+    shifted[..., max(dr, 0):height+min(dr, 0), max(dc, 0):width+min(dc, 0)] = \
+        array[..., max(-dr, 0):height+min(-dr, 0), max(-dc, 0):width+min(-dc, 0)]
+    return shifted
+
+
+def _uniform(random_state, start, size, count, dims):
+    """
+    Helper function to draw uniform random values for a batch of samples.
+
+    :return: numpy array of shape (count, size, height, width). With a RandomStreams object, the values of sample
+             start+k are drawn from stream k, so they do not depend on the batch size
+    """
+    if not isinstance(random_state, RandomStreams):
+        return random_state.rand(count, size, *dims)
+
+    values = np.zeros((count, size) + tuple(dims))
+    for k in range(size):
+        values[:, k] = random_state.random_state(start+k).rand(count, *dims)
+    return values
+
+
+def sample_burnt_area(forest, num_samples=1, batch_size=None, random_state=None):
+    """
+    Sample the final set of burnt Trees of an uncontrolled LatticeForest, starting from its current state,
+    without simulating each time step.
+
+    Without control, a Tree on fire stays on fire for a geometrically distributed number of time steps T, and
+    in the exponential model each neighbor on fire independently ignites a healthy Tree with probability alpha
+    each time step. A Tree on fire therefore ignites a healthy neighbor with probability 1-(1-alpha)**T,
+    where all neighbors share the same T, and the final burnt set is the set of Trees reachable from the
+    Trees on fire through the ignited edges. This gives the same distribution over final burnt sets as
+    stepping the simulator until the fire is extinguished. With a weighted neighborhood kernel, a neighbor with
+    weight w ignites a healthy Tree with probability 1-(1-alpha)**(w*T).
+
+    :param forest: LatticeForest simulator, which is not modified
+    :param num_samples: number of independent samples
+    :param batch_size: number of samples processed together, to limit memory use. Defaults to all samples
+    :param random_state: numpy RandomState for deterministic sampling, or a RandomStreams object to draw each sample
+                         from its own stream, which gives the same samples for any batch size
+    :return: 3D boolean numpy array of shape (num_samples, height, width), where True indicates a Tree that is
+             burnt at the end of the fire
+    """
+    element = next(iter(forest.group.values()))
+    if element.model != 'exponential':
+        raise ValueError('percolation sampling requires the exponential Tree model, '
+                         'because the linear model does not factor over neighbors')
+
+    if random_state is None:
+        random_state = np.random
+
+    alpha, beta = parameter_arrays(forest)
+    healthy = forest.state == element.healthy
+    on_fire = forest.state == element.on_fire
+    burnt = forest.state == element.burnt
+
+    # a Tree at offset (dr, dc) in the neighborhood of another Tree spreads fire to it at offset (-dr, -dc)
+    if forest.neighborhood is None:
+        offsets = NEIGHBOR_OFFSETS
+    else:
+        offsets = [(-dr, -dc, weight) for dr, dc, weight in forest.neighbor_offsets]
+
+    batch_size = num_samples if batch_size is None else batch_size
+    samples = []
+    for start in range(0, num_samples, batch_size):
+        size = min(batch_size, num_samples-start)
+        shape = (size,) + tuple(forest.dims)
+        uniform = _uniform(random_state, start, size, 1+len(offsets), forest.dims)
+
+        # number of time steps each Tree stays on fire, P(T > t) = beta**t, infinite if beta is 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            duration = np.floor(np.log(1 - uniform[0])/np.log(beta)) + 1
+        duration[:, beta >= 1] = np.inf
+        duration[:, beta <= 0] = 1
+
+        reached = np.broadcast_to(on_fire, shape).copy()
+        frontier = reached.copy()
+        edges = []
+        for k, (dr, dc, weight) in enumerate(offsets):
+            # probability that a Tree on fire ignites its neighbor at offset (dr, dc), using the neighbor's alpha
+            neighbor_alpha = _shift(alpha, -dr, -dc)
+            edges.append(uniform[1+k] < 1 - (1 - neighbor_alpha)**(weight*duration))
+
+        if Kernels.jit_enabled():
+            samples.append(Kernels.percolate(reached, edges, healthy, offsets) | burnt)
+            continue
+
+        # breadth-first search from the Trees on fire, one layer per iteration for all samples at once
+        while frontier.any():
+            ignited = np.zeros_like(frontier)
+            for (dr, dc, _), edge in zip(offsets, edges):
+                ignited |= _shift(frontier & edge, dr, dc)
+
+            frontier = ignited & healthy & ~reached
+            reached |= frontier
+
+        samples.append(reached | burnt)
+
+    return np.concatenate(samples)
+
+
+def burn_probability(forest, num_samples=100, batch_size=None, random_state=None):
+    """
+    Estimate the probability that each Tree is burnt at the end of the fire, using sample_burnt_area.
+
+    :return: 2D numpy array of probabilities
+    """
+    return sample_burnt_area(forest, num_samples=num_samples, batch_size=batch_size,
+                             random_state=random_state).mean(axis=0)
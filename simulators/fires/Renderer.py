@@ -0,0 +1,147 @@
+import numpy as np
+
+
+# RGB color of each element state: healthy, on fire, burnt, and removed for SimpleUrban elements
+DEFAULT_PALETTE = np.array([[34, 139, 34],
+                            [255, 69, 0],
+                            [64, 64, 64],
+                            [176, 196, 222]], dtype=np.uint8)
+
+
+def render_frame(state, palette=DEFAULT_PALETTE, scale=1, out=None):
+    """
+    Convert a lattice of element states into an RGB image with a palette lookup.
+
+    :param state: 2D numpy array of element states, such as LatticeForest.state
+    :param palette: uint8 numpy array of shape (number of states, 3) with the color of each state
+    :param scale: number of pixels along each side of an element
+    :param out: optional uint8 numpy array of shape (height*scale, width*scale, 3) to write the image to,
+                such as a frame of a FrameBuffer
+    :return: uint8 numpy array of shape (height*scale, width*scale, 3)
+    """
+    state = np.asarray(state)
+    height, width = state.shape
+    if out is None:
+        out = np.empty((height*scale, width*scale, 3), dtype=np.uint8)
+    elif not out.flags.c_contiguous:
+        # the fast paths below write through reshaped views, which would be copies of a strided array
+        out[...] = render_frame(state, palette, scale)
+        return out
+
+    # each color is viewed as a single 3 byte value, so that a pixel is copied in one operation
+    colors = np.ascontiguousarray(palette, dtype=np.uint8).view('V3').ravel()
+    if scale == 1:
+        np.take(colors, state, out=out.view('V3')[..., 0])
+        return out
+
+    # look up one row of pixels for each row of elements, then copy each row scale times
+    rows = np.take(colors, np.repeat(state, scale, axis=1)).view(np.uint8)
+    out.reshape(height, scale, width*scale*3)[...] = rows.reshape(height, 1, width*scale*3)
+    return out
+
+
+class FrameBuffer(object):
+    """
+    A preallocated buffer of RGB frames, which can be memory-mapped to a .npy file so that long trajectories are
+    streamed to disk instead of kept in memory.
+    """
+    def __init__(self, num_frames, dims, scale=1, palette=DEFAULT_PALETTE, path=None):
+        """
+        :param num_frames: maximum number of frames
+        :param dims: (height, width) of the lattice
+        :param scale: number of pixels along each side of an element
+        :param palette: color of each state, see render_frame
+        :param path: if not None, the frames are stored in a memory-mapped .npy file at this path
+        """
+        shape = (num_frames, dims[0]*scale, dims[1]*scale, 3)
+        if path is None:
+            self.frames = np.zeros(shape, dtype=np.uint8)
+        else:
+            self.frames = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+
+        self.scale = scale
+        self.palette = palette
+        self.count = 0
+
+    def append(self, state):
+        """
+        Render a lattice of element states into the next frame.
+
+        :return: the frame
+        """
+        if self.count >= len(self.frames):
+            raise IndexError('frame buffer is full')
+
+        frame = render_frame(state, self.palette, self.scale, out=self.frames[self.count])
+        self.count += 1
+        return frame
+
+    def flush(self):
+        """
+        Write a memory-mapped buffer to disk.
+        """
+        if isinstance(self.frames, np.memmap):
+            self.frames.flush()
+        return
+
+    def __len__(self):
+        return self.count
+
+
+def write_ppm(path, frame):
+    """
+    Write an RGB frame as a binary PPM image, which can be read by most image tools.
+
+    :param path: file path
+    :param frame: uint8 numpy array of shape (height, width, 3)
+    """
+    with open(path, 'wb') as f:
+        f.write('P6\n{0} {1}\n255\n'.format(frame.shape[1], frame.shape[0]).encode('ascii'))
+        f.write(np.ascontiguousarray(frame).tobytes())
+    return
+
+
+class VideoWriter(object):
+    """
+    Stream frames to a file without compression, either as raw RGB frames or as consecutive binary PPM images.
+    Both formats can be converted by ffmpeg, for example:
+        ffmpeg -f rawvideo -pix_fmt rgb24 -video_size WIDTHxHEIGHT -i frames.rgb output.mp4
+        ffmpeg -f image2pipe -c:v ppm -i frames.ppm output.mp4
+    """
+    def __init__(self, path, dims, scale=1, palette=DEFAULT_PALETTE, format='raw'):
+        """
+        :param path: file path
+        :param dims: (height, width) of the lattice
+        :param scale: number of pixels along each side of an element
+        :param palette: color of each state, see render_frame
+        :param format: 'raw' for raw RGB frames, or 'ppm' for consecutive PPM images
+        """
+        if format not in ['raw', 'ppm']:
+            raise ValueError("format must be 'raw' or 'ppm'")
+
+        self.scale = scale
+        self.palette = palette
+        self.frame = np.empty((dims[0]*scale, dims[1]*scale, 3), dtype=np.uint8)
+        self.header = b'' if format == 'raw' else \
+            'P6\n{0} {1}\n255\n'.format(self.frame.shape[1], self.frame.shape[0]).encode('ascii')
+        self.file = open(path, 'wb')
+        self.count = 0
+
+    def write(self, state):
+        """
+        Render a lattice of element states and append it to the file.
+        """
+        render_frame(state, self.palette, self.scale, out=self.frame)
+        self.file.write(self.header)
+        self.file.write(self.frame.data)
+        self.count += 1
+        return
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
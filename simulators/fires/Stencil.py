@@ -0,0 +1,73 @@
+import numpy as np
+
+from simulators import Kernels
+
+
+def stencil_kernel(neighborhood):
+    """
+    Create a weighted neighborhood kernel for a lattice. Entry (i, j) of the kernel is the weight of the element at
+    offset (i - center row, j - center col) when counting the neighbors on fire of the element at the center.
+
+    :param neighborhood: 'von_neumann' for 4 neighbors, 'moore' for 8 neighbors, an integer radius r for all
+                         elements within Euclidean distance r, or a 2D numpy array with odd dimensions, for example
+                         larger weights upwind to model the effects of wind
+    :return: 2D numpy array with odd dimensions, where the center entry is zero
+    """
+    if isinstance(neighborhood, str):
+        if neighborhood == 'von_neumann':
+            kernel = np.array([[0, 1, 0], [1, 0, 1], [0, 1, 0]])
+        elif neighborhood == 'moore':
+            kernel = np.ones((3, 3), dtype=int)
+        else:
+            raise ValueError("neighborhood must be 'von_neumann', 'moore', a radius, or an array")
+
+    elif np.isscalar(neighborhood):
+        radius = int(np.floor(neighborhood))
+        dr, dc = np.mgrid[-radius:radius+1, -radius:radius+1]
+        kernel = (dr**2 + dc**2 <= neighborhood**2).astype(int)
+
+    else:
+        kernel = np.array(neighborhood)
+        if kernel.ndim != 2 or kernel.shape[0] % 2 == 0 or kernel.shape[1] % 2 == 0:
+            raise ValueError('neighborhood array must be 2D with odd dimensions')
+
+    kernel[kernel.shape[0]//2, kernel.shape[1]//2] = 0
+    return kernel
+
+
+def stencil_offsets(kernel):
+    """
+    List the neighbors described by a kernel.
+
+    :param kernel: 2D numpy array created by stencil_kernel
+    :return: list of (delta row, delta col, weight) for each non-zero entry of the kernel
+    """
+    r_center, c_center = kernel.shape[0]//2, kernel.shape[1]//2
+    return [(i-r_center, j-c_center, kernel[i, j]) for i, j in zip(*np.nonzero(kernel))]
+
+
+def neighbor_counts(on_fire, kernel):
+    """
+    Calculate the weighted number of neighbors on fire for every element of a lattice, in one pass per kernel entry.
+    Positions outside the lattice are not on fire.
+
+    :param on_fire: 2D boolean numpy array indicating elements on fire
+    :param kernel: 2D numpy array created by stencil_kernel
+    :return: 2D numpy array with the same shape as on_fire
+    """
+    height, width = on_fire.shape
+    dtype = np.result_type(kernel.dtype, np.int64)
+    if Kernels.jit_enabled():
+        return Kernels.neighbor_counts(on_fire, stencil_offsets(kernel), dtype)
+
+    counts = np.zeros(on_fire.shape, dtype=dtype)
+
+    for dr, dc, weight in stencil_offsets(kernel):
+        if abs(dr) >= height or abs(dc) >= width:
+            continue
+
+        # counts[r, c] += weight*on_fire[r+dr, c+dc], for positions inside the lattice
+        counts[max(-dr, 0):height+min(-dr, 0), max(-dc, 0):width+min(-dc, 0)] += \
+            weight*on_fire[max(dr, 0):height+min(dr, 0), max(dc, 0):width+min(dc, 0)]
+
+    return counts
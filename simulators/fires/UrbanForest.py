@@ -2,35 +2,75 @@ from collections import defaultdict
 import itertools
 import numpy as np
 
+from simulators.fires.FireFront import FireFront
 from simulators.fires.ForestElements import Tree, SimpleUrban
+from simulators.fires.LatticeForest import element_parameter, flat_indices, LatticeMixin, parameter_field
+from simulators.fires.Stencil import stencil_kernel, stencil_offsets
+from simulators.Packing import as_state_array, pack_state
+from simulators.RandomStreams import make_random_state, step_random_state
 from simulators.Simulator import Simulator
 
 
-class UrbanForest(Simulator):
+class UrbanForest(LatticeMixin, Simulator):
     """
     A simulator for a lattice-based forest with urban elements. Based on the LatticeForest simulator.
     """
+    num_states = 4
 
     def __init__(self, dimension, urban_width, rng=None, initial_fire=None,
-                 alpha=None, beta=None, tree_model='exponential'):
-
+                 alpha=None, beta=None, tree_model='exponential', neighborhood=None):
+        """
+        Initializes a simulation object. Each element is a Tree or SimpleUrban with a (row, col) position.
+
+        :param dimension: size of forest, integer or (height, width)
+                          if an integer, the forest is square
+        :param urban_width: number of columns of SimpleUrban elements on the right edge of the lattice
+        :param rng: random number generator seed for deterministic sampling, or a RandomStreams object to sample
+                    each time step from its own stream
+        :param initial_fire: collection of (row, col) coordinates describing positions of initial fires
+        :param alpha: fire propagation parameter, as a dictionary with (row, col) as keys, a 2D numpy array,
+                      the path of a .npy file with a 2D array, which is memory-mapped and read lazily,
+                      or a function that takes the time step and returns a 2D numpy array
+        :param beta: fire persistence parameter, in the same formats as alpha
+        :param tree_model: simulation model for Tree elements, either 'linear' or 'exponential'
+        :param neighborhood: neighbors of each element, None for the 4 adjacent elements on the lattice, or a
+                             description accepted by stencil_kernel, such as 'moore' or a weighted kernel.
+                             With a kernel, the weighted number of neighbors on fire is calculated for all
+                             elements near the fire in one pass
+        """
         # LatticeForest.__init__(self, dimension, rng=rng, initial_fire=initial_fire,
         #                        alpha=alpha, beta=beta, tree_model=tree_model)
         Simulator.__init__(self)
 
         self.dims = (dimension, dimension) if isinstance(dimension, int) else dimension
         if tree_model == 'exponential':
-            self.alpha = defaultdict(lambda: 0.2763) if alpha is None else alpha
+            alpha = defaultdict(lambda: 0.2763) if alpha is None else alpha
         elif tree_model == 'linear':
-            self.alpha = defaultdict(lambda: 0.2) if alpha is None else alpha
-        self.beta = defaultdict(lambda: np.exp(-1/10)) if beta is None else beta
+            alpha = defaultdict(lambda: 0.2) if alpha is None else alpha
+        beta = defaultdict(lambda: np.exp(-1/10)) if beta is None else beta
+
+        # array-valued parameters are read directly when an element is sampled,
+        # so that they can be changed without modifying each element
+        self.alpha, self.alpha_schedule = parameter_field(alpha)
+        self.beta, self.beta_schedule = parameter_field(beta)
 
         self.rng = rng
-        self.random_state = np.random.RandomState(self.rng)
+        self.random_state = make_random_state(self.rng)
 
         self.urban = []
         self.urban_width = urban_width
 
+        # state of each element, kept consistent with the Tree and SimpleUrban elements
+        self.state = np.zeros(self.dims, dtype=np.uint8)
+        # fire front metrics, maintained as elements change state
+        self.front = FireFront(self.state)
+        # hash of the state array, created by state_hash
+        self.zobrist = None
+
+        # neighborhood kernel and the corresponding (delta row, delta col, weight) offsets
+        self.neighborhood = None if neighborhood is None else stencil_kernel(neighborhood)
+        self.neighbor_offsets = None if neighborhood is None else stencil_offsets(self.neighborhood)
+
         # the forest is a group of Trees and SimpleUrban elements
         self.group = dict()
         for r in range(self.dims[0]):
@@ -38,15 +78,21 @@ class UrbanForest(Simulator):
 
                 # urban elements compose the right-most edge of the lattice
                 if c >= self.dims[1]-self.urban_width:
-                    self.group[(r, c)] = SimpleUrban(self.alpha[(r, c)], self.beta[(r, c)], position=np.array([r, c]),
+                    self.group[(r, c)] = SimpleUrban(element_parameter(self.alpha, (r, c)),
+                                                     element_parameter(self.beta, (r, c)), position=np.array([r, c]),
                                                      numeric_id=r*self.dims[1]+c)
                     self.urban.append((r, c))
 
                 # all other elements are trees
                 else:
-                    self.group[(r, c)] = Tree(self.alpha[(r, c)], self.beta[(r, c)], position=np.array([r, c]),
+                    self.group[(r, c)] = Tree(element_parameter(self.alpha, (r, c)),
+                                              element_parameter(self.beta, (r, c)), position=np.array([r, c]),
                                               numeric_id=r*self.dims[1]+c, model=tree_model)
 
+                if self.neighborhood is not None:
+                    self.group[(r, c)].neighbors = self._neighborhood((r, c), 1)
+                    continue
+
                 if 0 <= r+1 < self.dims[0]:
                     self.group[(r, c)].neighbors.append((r+1, c))
                 if 0 <= r-1 < self.dims[0]:
@@ -56,10 +102,10 @@ class UrbanForest(Simulator):
                 if 0 <= c-1 < self.dims[1]:
                     self.group[(r, c)].neighbors.append((r, c-1))
 
-        self.stats_trees = np.zeros(3).astype(np.int)
+        self.stats_trees = np.zeros(3).astype(int)
         self.stats_trees[0] += self.dims[0]*self.dims[1] - len(self.urban)
 
-        self.stats_urban = np.zeros(4).astype(np.int)
+        self.stats_urban = np.zeros(4).astype(int)
         self.stats_urban[0] += len(self.urban)
 
         # start initial fire
@@ -67,10 +113,18 @@ class UrbanForest(Simulator):
         self.fires = []
         self.initial_fire = initial_fire
         self._start_fire()
+        # initial fires do not count towards the rate of spread
+        self.front.ignitions = 0
 
         self.early_end = False
         self.end = False
 
+        # flattened (row*width + col) indices of the elements that changed state in the last time step
+        self.changes = self._no_changes()
+
+        # the initial configuration, and the positions of elements whose state differs from it
+        self.initial_snapshot = self.snapshot()
+        self.changed = set()
         return
 
     def _start_fire(self):
@@ -82,6 +136,7 @@ class UrbanForest(Simulator):
             self.fires = self.initial_fire
             for p in self.initial_fire:
                 self.group[p].set_on_fire()
+                self._set_state(p, self.group[p].state)
 
                 if isinstance(self.group[p], Tree):
                     self.stats_trees[0] -= 1
@@ -94,8 +149,8 @@ class UrbanForest(Simulator):
 
         # start a 4x4 square of fires at center
         # if forest size is too small, start a single fire at the center
-        r_center = np.floor((self.dims[0]-1)/2).astype(np.uint8)
-        c_center = np.floor((self.dims[1]-1)/2).astype(np.uint8)
+        r_center = (self.dims[0]-1)//2
+        c_center = (self.dims[1]-1)//2
 
         delta_r = [0] if self.dims[0]<4 else [k for k in range(-1, 3)]
         delta_c = [0] if self.dims[1]<4 else [k for k in range(-1, 3)]
@@ -105,6 +160,7 @@ class UrbanForest(Simulator):
             r, c = r_center+dr, c_center+dc
             self.fires.append((r, c))
             self.group[(r, c)].set_on_fire()
+            self._set_state((r, c), self.group[(r, c)].state)
 
             if isinstance(self.group[(r, c)], Tree):
                 self.stats_trees[0] -= 1
@@ -115,54 +171,86 @@ class UrbanForest(Simulator):
 
         return
 
-    def reset(self):
+    def snapshot(self, packed=False):
         """
-        Reset the simulation object to its initial configuration.
-        """
-        # reset statistics
-        self.stats_trees = np.zeros(3).astype(np.int)
-        self.stats_trees[0] += self.dims[0]*self.dims[1] - len(self.urban)
+        Create a copy of the simulation state, including the random number generator state.
 
-        self.stats_urban = np.zeros(4).astype(np.int)
-        self.stats_urban[0] += len(self.urban)
+        :param packed: if True, the state of each element is packed into 2 bits, see pack_state
+        :return: dictionary describing the simulation state, which can be applied with 'restore'
+        """
+        return {'state': pack_state(self.state) if packed else self.state.copy(), 'fires': list(self.fires),
+                'stats_trees': self.stats_trees.copy(), 'stats_urban': self.stats_urban.copy(),
+                'iter': self.iter, 'end': self.end, 'early_end': self.early_end,
+                'random_state': self.random_state.get_state(legacy=False), 'front': self.front.snapshot(),
+                'hash': None if self.zobrist is None else int(self.zobrist)}
 
-        # reset elements
-        for element in self.group.values():
-            element.reset()
+    def restore(self, snapshot):
+        """
+        Set the simulation state from a snapshot created by 'snapshot', with a packed or unpacked state.
+        Only the elements whose state differs from the snapshot are modified.
+        """
+        snapshot = dict(snapshot, state=as_state_array(snapshot['state']))
+        positions = [tuple(p) for p in np.argwhere(self.state != snapshot['state']).tolist()]
+        self._restore(snapshot, positions)
+        self.changed = set(tuple(p) for p in np.argwhere(self.state != self.initial_snapshot['state']).tolist())
+        return
 
-        # reset to initial condition
-        self.iter = 0
-        self.fires = []
-        self._start_fire()
-        self.random_state = np.random.RandomState(self.rng)
+    def _restore(self, snapshot, positions):
+        """
+        Helper method to set the simulation state from a snapshot.
 
-        self.end = False
-        self.early_end = False
+        :param snapshot: dictionary created by 'snapshot'
+        :param positions: collection of (row, col) positions of elements whose state may differ from the snapshot
+        """
+        for p in positions:
+            self._set_state(p, int(snapshot['state'][p]))
+            self.group[p].state = int(self.state[p])
+            self.group[p].next_state = self.group[p].state
+        self.front.restore(snapshot['front'])
+
+        self.fires = list(snapshot['fires'])
+        self.stats_trees = snapshot['stats_trees'].copy()
+        self.stats_urban = snapshot['stats_urban'].copy()
+        self.iter = snapshot['iter']
+        self.changes = self._no_changes()
+        self.end = snapshot['end']
+        self.early_end = snapshot['early_end']
+        self.random_state.set_state(snapshot['random_state'])
         return
 
-    def dense_state(self):
+    def _no_changes(self):
         """
-        Creates a representation of the state of each Tree.
-
-        :return: 2D numpy array where each position (row, col) corresponds to a Tree state
+        Helper method to create an empty change set, see 'update'.
         """
-        return np.array([[self.group[(r, c)].state for c in range(self.dims[1])]
-                         for r in range(self.dims[0])])
+        return {'ignited': flat_indices([], self.dims), 'burnt': flat_indices([], self.dims),
+                'removed': flat_indices([], self.dims)}
 
-    def update(self, control=None):
+    def update(self, control=None, return_changes=False):
         """
-        Update the simulator one time step.
+        Update the simulator one time step. The elements that changed state are stored in self.changes.
 
         :param control: collection to map (row, col) to control for each Element,
                         which is a tuple of (delta_alpha, delta_beta)
+        :param return_changes: if True, return self.changes
+        :return: None, or a dictionary with the flattened (row*width + col) indices of the elements that caught on
+                 fire ('ignited'), burnt out ('burnt') and were removed ('removed') this time step
         """
         if self.end:
             print("fire extinguished")
-            return
+            self.changes = self._no_changes()
+            return self.changes if return_changes else None
 
         if control is None:
             control = defaultdict(lambda: (0, 0))
 
+        self.random_state = step_random_state(self.rng, self.iter, self.random_state)
+
+        # evaluate time-varying parameters
+        if self.alpha_schedule is not None:
+            self.alpha = np.asarray(self.alpha_schedule(self.iter))
+        if self.beta_schedule is not None:
+            self.beta = np.asarray(self.beta_schedule(self.iter))
+
         # assume that the fire cannot spread further this step,
         # which occurs when no healthy Trees have a neighbor that is on fire
         self.early_end = True
@@ -172,11 +260,14 @@ class UrbanForest(Simulator):
         # list of (row, col) positions corresponding to healthy elements that have been sampled to determine
         # if they will catch on fire
         checked = []
+        # list of (row, col) positions corresponding to elements that burn out this time step
+        burnt = []
 
         # calculate next state for urban elements not on fire, in case they are removed from the lattice
         do_not_check = []
         for u in self.urban:
             if self.group[u].is_healthy(self.group[u].state):
+                self._sync_parameters(u)
                 self.group[u].next(self.group, control[u], self.random_state)
 
                 if self.group[u].is_removed(self.group[u].next_state):
@@ -187,8 +278,12 @@ class UrbanForest(Simulator):
         # fire spreading check:
         #   iterate over current fires, find their neighbors that are healthy, and sample
         #   to determine if the healthy element catches on fire
+        counts = self._neighbor_counts()
+
         for f in self.fires:
-            for fn in self.group[f].neighbors:
+            # elements whose number of neighbors on fire depends on the current element on fire
+            spread = self.group[f].neighbors if self.neighborhood is None else self._neighborhood(f, -1)
+            for fn in spread:
                 if fn not in checked and self.group[fn].is_healthy(self.group[fn].state):
 
                     if isinstance(self.group[fn], SimpleUrban) and fn in do_not_check:
@@ -197,15 +292,22 @@ class UrbanForest(Simulator):
                     self.early_end = False
 
                     # calculate next state
-                    self.group[fn].next(self.group, control[fn], self.random_state)
+                    self._sync_parameters(fn)
+                    if counts is None:
+                        self.group[fn].next(self.group, control[fn], self.random_state)
+                    else:
+                        self.group[fn].next(self.group, control[fn], self.random_state,
+                                            counts[0][fn[0]-counts[1], fn[1]-counts[2]])
                     if self.group[fn].is_on_fire(self.group[fn].next_state):
                         add.append(fn)
 
                     checked.append(fn)
 
             # determine if the current element on fire will extinguish this time step
+            self._sync_parameters(f)
             self.group[f].next(self.group, control[f], self.random_state)
             if self.group[f].is_burnt(self.group[f].next_state):
+                burnt.append(f)
                 if isinstance(self.group[f], Tree):
                     self.stats_trees[1] -= 1
                     self.stats_trees[2] += 1
@@ -217,6 +319,9 @@ class UrbanForest(Simulator):
         for element in self.group.values():
             element.update()
 
+        for p in itertools.chain(do_not_check, burnt, add):
+            self._set_state(p, self.group[p].state)
+
         # retain elements that are still on fire
         self.fires = [f for f in self.fires if self.group[f].is_on_fire(self.group[f].state)]
 
@@ -230,11 +335,17 @@ class UrbanForest(Simulator):
                 self.stats_urban[0] -= 1
                 self.stats_urban[1] += 1
 
+        self.changed.update(do_not_check)
+        self.changed.update(burnt)
+        self.changed.update(add)
+        self.changes = {'ignited': flat_indices(add, self.dims), 'burnt': flat_indices(burnt, self.dims),
+                        'removed': flat_indices(do_not_check, self.dims)}
+        self.front.step()
+
         self.iter += 1
 
         if not self.fires:
             self.early_end = True
             self.end = True
-            return
 
-        return
+        return self.changes if return_changes else None
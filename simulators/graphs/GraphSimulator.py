@@ -0,0 +1,279 @@
+from array import array
+import numpy as np
+
+from simulators import Kernels
+from simulators.RandomStreams import make_random_state, step_random_state
+from simulators.Simulator import Simulator
+
+
+def read_edge_list(path, comments='#', delimiter=None, chunk_size=1 << 16):
+    """
+    Stream an edge list file into compact integer arrays. Each line describes one edge as 'source target',
+    where source and target are non-negative integer node ids. Additional columns are ignored.
+
+    :param path: path to the edge list file
+    :param comments: lines starting with this string are skipped
+    :param delimiter: column delimiter, whitespace if None
+    :param chunk_size: number of edges buffered before being appended to the output arrays
+    :return: tuple (source, target) of 1D int64 numpy arrays
+    """
+    source = array('q')
+    target = array('q')
+    buffer_source = []
+    buffer_target = []
+
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(comments):
+                continue
+
+            columns = line.split(delimiter)
+            buffer_source.append(int(columns[0]))
+            buffer_target.append(int(columns[1]))
+
+            # flush the buffers periodically to keep memory use proportional to the number of edges
+            if len(buffer_source) >= chunk_size:
+                source.extend(buffer_source)
+                target.extend(buffer_target)
+                buffer_source = []
+                buffer_target = []
+
+    source.extend(buffer_source)
+    target.extend(buffer_target)
+
+    return np.frombuffer(source, dtype=np.int64), np.frombuffer(target, dtype=np.int64)
+
+
+def build_adjacency(source, target, num_nodes=None, directed=False):
+    """
+    Build a compressed sparse row (CSR) adjacency structure from an edge list.
+
+    :param source: 1D array of edge source node ids
+    :param target: 1D array of edge target node ids
+    :param num_nodes: number of nodes in the graph, inferred from the edge list if None
+    :param directed: if False, every edge is added in both directions
+    :return: tuple (indptr, indices), where the neighbors of node i are indices[indptr[i]:indptr[i+1]]
+    """
+    source = np.asarray(source, dtype=np.int64)
+    target = np.asarray(target, dtype=np.int64)
+
+    if not directed:
+        source, target = np.concatenate([source, target]), np.concatenate([target, source])
+
+    if num_nodes is None:
+        num_nodes = int(max(source.max(initial=-1), target.max(initial=-1))) + 1
+
+    # use the smallest index type that can address every node
+    index_type = np.int32 if num_nodes < np.iinfo(np.int32).max else np.int64
+
+    order = np.argsort(source, kind='stable')
+    indices = target[order].astype(index_type)
+    indptr = np.zeros(num_nodes+1, dtype=np.int64)
+    np.cumsum(np.bincount(source, minlength=num_nodes), out=indptr[1:])
+
+    return indptr, indices
+
+
+def gather_neighbors(indptr, indices, nodes):
+    """
+    Concatenate the neighbor lists of a collection of nodes.
+
+    :param indptr: CSR row pointer array
+    :param indices: CSR column index array
+    :param nodes: 1D array of node ids
+    :return: 1D array of neighbor node ids, with repeats
+    """
+    starts = indptr[nodes]
+    lengths = indptr[nodes+1] - starts
+    total = lengths.sum()
+    if total == 0:
+        return indices[:0]
+    if Kernels.jit_enabled():
+        return Kernels.gather_neighbors(indptr, indices, nodes, total)
+
+    # offset of each neighbor relative to the start of its list, computed without a Python loop
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return indices[offsets + np.arange(total)]
+
+
+class GraphSimulator(Simulator):
+    """
+    A simulator for a three-state Markov process on a large graph, stored as compact arrays instead of
+    per-node Elements. The states healthy/active/removed correspond to healthy/on_fire/burnt for a forest fire
+    and to healthy/infected/immune for an epidemic.
+    """
+    def __init__(self, source, target, initial_active, num_nodes=None, directed=False, rng=None,
+                 alpha=None, beta=None, model='exponential', process='fire'):
+        """
+        Initializes a simulation object from an edge list. Nodes are integer ids in [0, num_nodes).
+
+        :param source: 1D array of edge source node ids
+        :param target: 1D array of edge target node ids
+        :param initial_active: collection of node ids that are initially on fire/infected
+        :param num_nodes: number of nodes in the graph, inferred from the edge list if None
+        :param directed: if False, edges are undirected. Otherwise, an active source can only affect its target
+        :param rng: random number generator seed for deterministic sampling, or a RandomStreams object to sample
+                    each time step from its own stream
+        :param alpha: propagation parameter (alpha for fires, eta for epidemics), scalar or array with one entry per node
+        :param beta: persistence parameter, scalar or array with one entry per node
+        :param model: transition model for healthy nodes, either 'linear' or 'exponential'
+        :param process: 'fire' or 'epidemic', which only changes the default parameters.
+                        Epidemics are non-self-terminating, active nodes only become removed with control
+        """
+        Simulator.__init__(self)
+
+        self.indptr, self.indices = build_adjacency(source, target, num_nodes=num_nodes, directed=directed)
+        self.dims = self.indptr.size - 1
+        self.model = model
+
+        # states and state space definition
+        self.healthy = 0
+        self.active = 1
+        self.removed = 2
+
+        if alpha is None:
+            if process == 'fire':
+                alpha = 0.2763 if model == 'exponential' else 0.2
+            elif process == 'epidemic':
+                alpha = 0.08 if model == 'exponential' else 0.17
+        if beta is None:
+            beta = np.exp(-1/10) if process == 'fire' else 1
+
+        # per-node parameters, scalars are broadcast without allocating an array per node
+        self.alpha = self._node_array(alpha)
+        self.beta = self._node_array(beta)
+
+        self.rng = rng
+        self.random_state = make_random_state(self.rng)
+
+        self.initial_active = np.unique(np.asarray(initial_active, dtype=np.int64))
+        self.state = np.zeros(self.dims, dtype=np.uint8)
+        self.active_set = np.zeros(0, dtype=np.int64)  # node ids that are currently active
+        self._start()
+
+        self.end = False
+        self.early_end = False
+        return
+
+    @classmethod
+    def from_edge_list(cls, path, initial_active, comments='#', delimiter=None, **kwargs):
+        """
+        Initializes a simulation object from an edge list file, see read_edge_list for the file format.
+        Keyword arguments are passed to the constructor.
+        """
+        source, target = read_edge_list(path, comments=comments, delimiter=delimiter)
+        return cls(source, target, initial_active, **kwargs)
+
+    def _node_array(self, value):
+        """
+        Helper method to represent a per-node parameter as an array with one entry per node.
+        """
+        value = np.asarray(value, dtype=np.float64)
+        if value.ndim == 0:
+            return np.broadcast_to(value, (self.dims,))
+        if value.shape != (self.dims,):
+            raise ValueError('expected a scalar or an array of shape ({0},)'.format(self.dims))
+        return value
+
+    def _start(self):
+        """
+        Helper method to apply the initial condition.
+        """
+        self.state[self.initial_active] = self.active
+        self.active_set = self.initial_active.copy()
+
+        # statistics for the simulation: number of [healthy, active, removed] nodes
+        self.stats = np.zeros(3).astype(np.uint32)
+        self.stats[0] += self.dims - self.active_set.size
+        self.stats[1] += self.active_set.size
+        return
+
+    def reset(self):
+        """
+        Reset the simulation object to its initial configuration.
+        """
+        self.state[:] = self.healthy
+        self._start()
+
+        self.iter = 0
+        self.random_state = make_random_state(self.rng)
+
+        self.end = False
+        self.early_end = False
+        return
+
+    def dense_state(self):
+        """
+        Creates a representation of the state of each node.
+
+        :return: 1D numpy array where each entry corresponds to a node state
+        """
+        return self.state.copy()
+
+    def _control_arrays(self, control, nodes):
+        """
+        Helper method to evaluate a control for a subset of nodes.
+        """
+        if control is None:
+            return 0, 0
+
+        delta_alpha, delta_beta = control
+        delta_alpha = np.asarray(delta_alpha, dtype=np.float64)
+        delta_beta = np.asarray(delta_beta, dtype=np.float64)
+
+        return (delta_alpha if delta_alpha.ndim == 0 else delta_alpha[nodes],
+                delta_beta if delta_beta.ndim == 0 else delta_beta[nodes])
+
+    def update(self, control=None):
+        """
+        Update the simulator one time step. Only active nodes and their neighbors are considered.
+
+        :param control: tuple of (delta_alpha, delta_beta), where each entry is a scalar applied to every node
+                        or an array with one entry per node
+        """
+        if self.end:
+            print("process has terminated")
+            return
+
+        self.random_state = step_random_state(self.rng, self.iter, self.random_state)
+
+        # healthy neighbors of active nodes, and the number of active neighbors of each
+        if Kernels.jit_enabled():
+            neighbors = Kernels.healthy_neighbors(self.indptr, self.indices, self.active_set, self.state, self.healthy)
+        else:
+            neighbors = gather_neighbors(self.indptr, self.indices, self.active_set)
+            neighbors = neighbors[self.state[neighbors] == self.healthy]
+        candidates, number_active_neighbors = np.unique(neighbors, return_counts=True)
+        self.early_end = candidates.size == 0
+
+        # calculate transition probability for healthy nodes and sample
+        delta_alpha, _ = self._control_arrays(control, candidates)
+        if self.model == 'linear':
+            transition_p = (self.alpha[candidates] - delta_alpha)*number_active_neighbors
+        else:
+            transition_p = 1 - (1 - self.alpha[candidates] + delta_alpha)**number_active_neighbors
+        add = candidates[self.random_state.rand(candidates.size) < transition_p]
+
+        # calculate transition probability for active nodes and sample
+        _, delta_beta = self._control_arrays(control, self.active_set)
+        transition_p = 1 - self.beta[self.active_set] + delta_beta
+        remove = self.random_state.rand(self.active_set.size) < transition_p
+
+        # apply next state
+        self.state[self.active_set[remove]] = self.removed
+        self.state[add] = self.active
+        self.active_set = np.concatenate([self.active_set[~remove], add])
+
+        self.stats[0] -= add.size
+        self.stats[1] += add.size
+        self.stats[1] -= np.count_nonzero(remove)
+        self.stats[2] += np.count_nonzero(remove)
+
+        self.iter += 1
+
+        if self.active_set.size == 0:
+            self.early_end = True
+            self.end = True
+
+        return